@@ -0,0 +1,40 @@
+"""
+bili_utils.py — 组件间共享的小工具（非注册组件，供各组件直接 import）
+"""
+
+import os
+import re
+import sys
+from typing import Callable, Iterable, List
+
+from registry import registry
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+_BLV_DIGITS = re.compile(r"^\d+")
+
+
+def clean_ls_line(line: str) -> str:
+    """去掉 ls 输出中的 ANSI 颜色码与首尾空白"""
+    return _ANSI_RE.sub("", line).strip()
+
+
+def parse_ls(stdout: str) -> List[str]:
+    """清洗 ls 输出，返回非空文件名列表"""
+    return [name for name in map(clean_ls_line, stdout.splitlines()) if name]
+
+
+def sort_blv_segments(paths: Iterable[str]) -> List[str]:
+    """挑出 .blv 分段并按文件名数字前缀排序（0.blv, 1.blv, ..., 10.blv）；每个名字只匹配一次，再做元组排序"""
+    keyed = [(int(m.group(0)) if (m := _BLV_DIGITS.match(os.path.basename(p))) else 0, p)
+             for p in paths if p.endswith(".blv")]
+    return [p for _, p in sorted(keyed)]
+
+
+def inherit_context(fn: Callable) -> Callable:
+    """
+    在提交方线程调用：返回的函数在辅助线程中执行时沿用提交方的组件调用栈；
+    并行处理时 sys.stdout 为按任务缓冲的输出（提供 propagate），辅助线程的输出同样写入提交方任务的缓冲。
+    """
+    fn = registry.propagate(fn)
+    propagate = getattr(sys.stdout, "propagate", None)
+    return propagate(fn) if propagate is not None else fn
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """本地导出组件（移动视频到用户指定目录）"""
-import os, shutil, re
+import os, shutil, re, errno
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from registry import registry
 
+_HAN_RE = re.compile(r'[\u4e00-\u9fff]')
+
 @registry.register("exporter.local", "service", "export(source_dir, target_dir) -> tuple")
 class LocalExporter:
     def __init__(self):
@@ -12,7 +15,8 @@ class LocalExporter:
     def list_mp4_files(self, source_dir: str) -> List[str]:
         """列出源目录下所有 MP4 文件"""
         try:
-            return [f for f in os.listdir(source_dir) if f.endswith('.mp4')]
+            with os.scandir(source_dir) as it:
+                return [e.name for e in it if e.name.endswith('.mp4') and e.is_file()]
         except Exception as e:
             print(f"❌ 列出视频文件失败: {e}")
             return []
@@ -21,7 +25,8 @@ class LocalExporter:
         """清洗路径：去中文、统一分隔符"""
         if path.startswith('/sdcard'):
             path = path.replace('/sdcard', '/storage/emulated/0', 1)
-        if re.search(r'[\u4e00-\u9fff]', path):
+        # 纯 ASCII 路径（C 层判断）直接短路，不必逐字符扫描
+        if not path.isascii() and _HAN_RE.search(path):
             print(f"⚠️  路径含中文，改为: {self.fallback_dir}")
             path = self.fallback_dir
         return path
@@ -51,15 +56,34 @@ class LocalExporter:
         success_count = 0
         fail_count = 0
         
-        for filename in mp4_files:
-            src = f"{source_dir}/{filename}"
-            dst = f"{target_dir}/{filename}"
-            try:
+        # 同一挂载点内 rename 只改元数据；跨挂载点（EXDEV）的交给线程池并行复制
+        copies = {}
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for filename in mp4_files:
+                src = f"{source_dir}/{filename}"
+                dst = f"{target_dir}/{filename}"
                 print(f"ℹ️  移动: {filename}")
-                shutil.move(src, dst)
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                print(f"❌ 移动失败 ({filename}): {e}")
+                try:
+                    os.rename(src, dst)
+                    success_count += 1
+                except OSError as e:
+                    if e.errno == errno.EXDEV:
+                        copies[pool.submit(self._copy_and_remove, src, dst)] = filename
+                    else:
+                        fail_count += 1
+                        print(f"❌ 移动失败 ({filename}): {e}")
+            
+            for future, filename in copies.items():
+                try:
+                    future.result()
+                    success_count += 1
+                except Exception as e:
+                    fail_count += 1
+                    print(f"❌ 移动失败 ({filename}): {e}")
         
         return success_count, fail_count
+    
+    def _copy_and_remove(self, src: str, dst: str):
+        """跨文件系统移动：copyfile（内核 sendfile/copy_file_range）后删除源文件"""
+        shutil.copyfile(src, dst)
+        os.unlink(src)
@@ -25,8 +25,9 @@ def import_module_from_file(py_file: Path, package_name: str, rel_path: Path):
     spec = importlib.util.spec_from_file_location(module_name, py_file)
     if spec and spec.loader:
         module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
+        # 先放入 sys.modules 再执行，注册时 inspect.getsourcefile 才能定位源文件
         sys.modules[module_name] = module
+        spec.loader.exec_module(module)
         return True
     return False
 
@@ -58,10 +59,6 @@ def scan_and_import():
     
     return imported
 
-# ========== 执行自动扫描导入 ==========
-loaded_modules = scan_and_import()
-print(f"✅ 全库智能加载完成，已注册 {len(loaded_modules)} 个组件")
-
 # --- 核心修改部分：严格按照要求进行树状打印 ---
 from collections import defaultdict
 
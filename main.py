@@ -42,6 +42,7 @@ def main():
         return cli.main()
     except KeyboardInterrupt:
         print("\n\n⚠️  用户中断")
+        registry.get_service("progress.manager").force_save()
         return 130
     except Exception as e:
         print(f"❌ 未预期的错误: {e}")
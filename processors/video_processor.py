@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 """视频处理器（核心编排组件）"""
-import os, shutil
+import os, re, shutil, traceback
 from typing import Dict
 from registry import registry
 
+_ILLEGAL_CHARS_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
 @registry.register("video.processor", "processor", "process(uid, c_folder, progress) -> bool")
 class VideoProcessor:
     def __init__(self):
@@ -14,6 +16,7 @@ class VideoProcessor:
         self.extractor_blv = None
         self.merger = None
         self.progress_mgr = None
+        self.file_index = None
         
         self.output_dir = "/storage/emulated/0/Download/B站视频"
         self.temp_base = "/storage/emulated/0/Download/bili_temp"
@@ -27,6 +30,7 @@ class VideoProcessor:
         self.extractor_blv = kwargs.get('extractor_blv')
         self.merger = kwargs.get('merger')
         self.progress_mgr = kwargs.get('progress_mgr')
+        self.file_index = kwargs.get('file_index')
     
     def _validate_entry(self, entry) -> bool:
         """验证 entry.json"""
@@ -40,7 +44,6 @@ class VideoProcessor:
     
     def _extract_title(self, entry: dict) -> str:
         """提取标题并清洗文件名"""
-        import re
         page_data = entry.get('page_data', {})
         part = page_data.get('part', '')
         title = entry.get('title', '未命名')
@@ -51,7 +54,7 @@ class VideoProcessor:
             full_title = title
         
         # 清洗非法字符
-        cleaned = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', full_title)
+        cleaned = _ILLEGAL_CHARS_RE.sub('_', full_title)
         cleaned = cleaned.strip('. ')
         
         # 按字节截断（防 Errno 36）
@@ -70,11 +73,16 @@ class VideoProcessor:
     
     def _cleanup_temp(self, temp_dir: str):
         """清理临时目录"""
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    def _discard_output(self, output_path: str) -> bool:
+        """流式输入不完整：删除 ffmpeg 产出的截断文件，返回 False（不记入进度）"""
+        print(f"❌ 源文件读取不完整，丢弃输出: {os.path.basename(output_path)}")
         try:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-        except Exception as e:
-            print(f"⚠️  清理临时目录失败: {e}")
+            os.remove(output_path)
+        except OSError:
+            pass
+        return False
     
     def process(self, uid: str, c_folder: str, progress: Dict) -> bool:
         """
@@ -110,8 +118,10 @@ class VideoProcessor:
             output_path = f"{self.output_dir}/{output_filename}"
             print(f"ℹ️  标题: {title}")
             
-            # 4. 扫描质量目录
-            quality_dirs = self.scanner.list_quality_dirs(uid, c_folder)
+            # 4. 扫描质量目录（有文件索引时直接查表）
+            quality_dirs = self.file_index.quality_dirs(uid, c_folder) if self.file_index else None
+            if quality_dirs is None:
+                quality_dirs = self.scanner.list_quality_dirs(uid, c_folder)
             if not quality_dirs:
                 print(f"⚠️  未找到质量目录: {c_folder}")
                 return False
@@ -119,7 +129,12 @@ class VideoProcessor:
             quality = quality_dirs[0]
             
             # 5. 检测格式
-            fmt = self.format_detector.detect(uid, c_folder, quality)
+            names = self.file_index.list_dir(f"{self.scanner.bili_root}/{uid}/{c_folder}/{quality}") \
+                if self.file_index else None
+            if names is not None:
+                fmt = self.format_detector.detect_from_names(names)
+            else:
+                fmt = self.format_detector.detect(uid, c_folder, quality)
             quality_label = self.format_detector.quality_label(quality)
             print(f"ℹ️  质量: {quality_label}  格式: {fmt}")
             
@@ -129,10 +144,23 @@ class VideoProcessor:
             
             # 7. 根据格式提取 + 合并
             if fmt == "blv":
-                success = self.extractor_blv.extract(uid, c_folder, quality, temp_dir)
-                if not success:
-                    return False
-                success = self.merger.merge_blv(temp_dir, output_path)
+                # 优先让 ffmpeg 直接读缓存；其次经命名管道喂给 ffmpeg；都不支持时复制分段
+                local_segments = self.extractor_blv.local_segments(uid, c_folder, quality)
+                stream_dir = None if local_segments else self.extractor_blv.stream(uid, c_folder, quality)
+                if local_segments:
+                    success = self.merger.merge_blv(temp_dir, output_path, segments=local_segments)
+                elif stream_dir:
+                    try:
+                        success = self.merger.merge_blv(stream_dir, output_path)
+                    finally:
+                        streamed_ok = self.extractor_blv.finish_stream(stream_dir)
+                    if success and not streamed_ok:
+                        success = self._discard_output(output_path)
+                else:
+                    success = self.extractor_blv.extract(uid, c_folder, quality, temp_dir)
+                    if not success:
+                        return False
+                    success = self.merger.merge_blv(temp_dir, output_path)
             
             elif fmt in ("dash", "mp4"):
                 video_dst, audio_dst, success = self.extractor_dash.extract(
@@ -140,7 +168,12 @@ class VideoProcessor:
                 )
                 if not success:
                     return False
-                success = self.merger.merge_dash(temp_dir, output_path, audio_file=audio_dst)
+                try:
+                    success = self.merger.merge_dash(temp_dir, output_path, audio_file=audio_dst, video_file=video_dst)
+                finally:
+                    streamed_ok = self.extractor_dash.finish_stream(temp_dir)
+                if success and not streamed_ok:
+                    success = self._discard_output(output_path)
             
             else:
                 print(f"❌ 未知格式: {fmt}")
@@ -148,14 +181,12 @@ class VideoProcessor:
             
             # 8. 记录进度
             if success:
-                progress[c_folder] = True
-                self.progress_mgr.save(progress)
+                self.progress_mgr.mark_done(progress, c_folder)
             
             return success
         
         except Exception as e:
             print(f"❌ 处理失败 ({c_folder}): {e}")
-            import traceback
             traceback.print_exc()
             return False
         
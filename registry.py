@@ -4,6 +4,7 @@ import inspect
 import yaml
 import os
 import re
+import threading
 from pathlib import Path
 from collections import defaultdict
 from contextlib import contextmanager
@@ -30,7 +31,8 @@ class Registry:
         self._service_cache: Dict[str, Any] = {}
         # 【新增】运行时依赖追踪系统
         self.runtime_dependencies: Dict[str, set] = defaultdict(set)
-        self._component_stack: List[str] = []
+        # 调用栈与追踪深度按线程隔离，并行处理视频时互不串栈
+        self._local = threading.local()
         self._track_depth = 0
         self._max_track_depth = 20  # 可配置，20层通常足够防栈溢出
     def _load_existing(self):
@@ -230,6 +232,22 @@ class Registry:
     # 运行时依赖追踪核心方法
     # ================================================
 
+    @property
+    def _component_stack(self) -> List[str]:
+        """当前线程的组件调用栈"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @property
+    def _track_depth(self) -> int:
+        return getattr(self._local, 'depth', 0)
+
+    @_track_depth.setter
+    def _track_depth(self, value: int):
+        self._local.depth = value
+
     def _push_component(self, name: str):
         """压栈当前执行组件"""
         if name in self.component_instances:
@@ -244,6 +262,23 @@ class Registry:
         """获取当前执行组件"""
         return self._component_stack[-1] if self._component_stack else None
 
+    def propagate(self, fn: Callable) -> Callable:
+        """
+        包装要交给辅助线程（灌流线程、复制线程池）执行的函数：
+        辅助线程以提交方线程当前的组件调用栈开始，错误事件仍能记录到正确的 caller。
+        """
+        parent = list(self._component_stack)
+        import functools
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            saved = getattr(self._local, 'stack', None)
+            self._local.stack = list(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.stack = saved
+        return run
+
     def _record_runtime_dependency(self, callee: str):
         """自动记录运行时调用：当前组件 → callee"""
         caller = self._get_current_component()
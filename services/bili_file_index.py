@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""B站缓存文件索引（一次 find 取回整棵缓存树，之后按目录 O(1) 查询）"""
+from typing import Dict, List, Optional, Set
+from registry import registry
+
+@registry.register("bili.file_index", "service", "list_dir(path: str) -> Optional[Set[str]]")
+class BiliFileIndex:
+    def __init__(self):
+        self.bili_root = "/storage/emulated/0/Android/data/tv.danmaku.bili/download"
+        self.rish_exec = None
+        # 目录绝对路径 → {文件名: 是否目录}；None 表示尚未建立索引
+        self._dirs: Optional[Dict[str, Dict[str, bool]]] = None
+    
+    def set_rish_executor(self, rish_exec):
+        self.rish_exec = rish_exec
+    
+    def build(self) -> int:
+        """一次 rish find 列出 uid/c_*/质量/文件 四层，返回索引的条目数；失败时保持未建立状态"""
+        if not self.rish_exec:
+            raise RuntimeError("rish_exec 未注入")
+        _, out, _ = self.rish_exec(
+            f"find '{self.bili_root}' -mindepth 1 -maxdepth 4 -printf '%y %P\\n'", timeout=120
+        )
+        dirs: Dict[str, Dict[str, bool]] = {}
+        count = 0
+        for line in out.splitlines():
+            kind, _, rel = line.partition(" ")
+            if not rel:
+                continue
+            parent, _, name = rel.rpartition("/")
+            parent_path = f"{self.bili_root}/{parent}" if parent else self.bili_root
+            is_dir = kind == "d"
+            dirs.setdefault(parent_path, {})[name] = is_dir
+            if is_dir:
+                dirs.setdefault(f"{self.bili_root}/{rel}", {})
+            count += 1
+        self._dirs = dirs
+        return count
+    
+    def list_dir(self, path: str) -> Optional[Set[str]]:
+        """目录下的文件名集合；未建立索引或目录不在索引范围内时返回 None（由调用方走 rish）"""
+        if self._dirs is None:
+            return None
+        entries = self._dirs.get(path.rstrip("/"))
+        return set(entries) if entries is not None else None
+    
+    def quality_dirs(self, uid: str, c_folder: str) -> Optional[List[str]]:
+        """质量目录（纯数字子目录）；不在索引中时返回 None"""
+        if self._dirs is None:
+            return None
+        entries = self._dirs.get(f"{self.bili_root}/{uid}/{c_folder}")
+        if entries is None:
+            return None
+        return [name for name, is_dir in entries.items() if is_dir and name.isdigit()]
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """缓存格式检测组件（DASH / MP4 / BLV）"""
 from registry import registry
+from bili_utils import parse_ls
 
 # 格式常量
 FMT_DASH = "dash"
@@ -10,6 +11,10 @@ FMT_UNKNOWN = "unknown"
 
 QUALITY_LABEL = {"112":"1080P+","80":"1080P","64":"720P","32":"480P","16":"360P"}
 
+# 标志文件（按优先级）
+_MARKERS = ((FMT_DASH, "video.m4s"), (FMT_MP4, "video.mp4"), (FMT_BLV, "index.json"))
+
+
 @registry.register("bili.format_detector", "service", "detect(uid: str, c_folder: str, quality: str) -> str")
 class BiliFormatDetector:
     def __init__(self):
@@ -20,17 +25,23 @@ class BiliFormatDetector:
         self.rish_exec = rish_exec
     
     def detect(self, uid: str, c_folder: str, quality: str) -> str:
-        """探测格式：dash / mp4 / blv / unknown"""
+        """探测格式：dash / mp4 / blv / unknown（一次 rish ls 取目录清单）"""
         if not self.rish_exec:
             raise RuntimeError("rish_exec 未注入")
         base = f"{self.bili_root}/{uid}/{c_folder}/{quality}"
-        for fmt, fname in [(FMT_DASH,"video.m4s"),(FMT_MP4,"video.mp4"),(FMT_BLV,"index.json")]:
-            try:
-                rc, _, _ = self.rish_exec(f"test -f '{base}/{fname}'", check=False, timeout=15)
-                if rc == 0:
-                    return fmt
-            except Exception:
-                continue
+        try:
+            rc, out, _ = self.rish_exec(f"ls -1 '{base}'", check=False, timeout=15)
+        except Exception:
+            return FMT_UNKNOWN
+        if rc != 0:
+            return FMT_UNKNOWN
+        return self.detect_from_names(parse_ls(out))
+    
+    def detect_from_names(self, names) -> str:
+        """按目录清单判定格式（与 detect 相同的优先级，无需 rish）"""
+        for fmt, fname in _MARKERS:
+            if fname in names:
+                return fmt
         return FMT_UNKNOWN
     
     def quality_label(self, q: str) -> str:
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""扫描结果磁盘缓存（UID → c_* 映射，按 UID 目录 mtime 失效）"""
+import os, json, time
+from typing import Dict, List
+from registry import registry
+
+@registry.register("bili.scan_cache", "service", "list_all_c_folders(refresh: bool = False) -> Dict[str, List[str]]")
+class BiliScanCache:
+    def __init__(self):
+        self.cache_file = None
+        self.scanner = None
+        self.ttl = 600  # 秒；有效期内完全不访问 rish
+    
+    def set_scanner(self, scanner):
+        self.scanner = scanner
+    
+    def set_cache_file(self, path: str):
+        self.cache_file = path
+    
+    def _load(self) -> Dict:
+        """读取缓存；文件损坏或结构不符（旧版本、手工编辑）时视为空缓存，重新扫描"""
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if not isinstance(cache["time"], (int, float)):
+                return {}
+            for entry in cache["uids"].values():
+                c_folders = entry["c_folders"]
+                if not isinstance(entry["mtime"], str) or not isinstance(c_folders, list) \
+                        or not all(isinstance(c, str) for c in c_folders):
+                    return {}
+            return cache
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
+    
+    def _save(self, uids: Dict[str, Dict]):
+        if not self.cache_file:
+            return
+        tmp = self.cache_file + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"time": time.time(), "uids": uids}, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            print(f"⚠️  写入扫描缓存失败: {e}")
+    
+    def list_all_c_folders(self, refresh: bool = False) -> Dict[str, List[str]]:
+        """
+        返回 {uid: [c_folder, ...]}。
+        
+        缓存未过期时直接返回；过期后只取一次 UID 目录 mtime，mtime 未变的 UID 沿用缓存，
+        其余 UID 重新扫描（多个时走一次批量 find）。refresh=True 时忽略缓存。
+        """
+        cache = {} if refresh else self._load()
+        cached = cache.get("uids", {})
+        if cached and time.time() - cache.get("time", 0) < self.ttl:
+            print("ℹ️  使用扫描缓存")
+            return {uid: e["c_folders"] for uid, e in sorted(cached.items()) if e["c_folders"]}
+        
+        mtimes = self.scanner.uid_mtimes()
+        stale = [uid for uid, mtime in mtimes.items()
+                 if uid not in cached or cached[uid].get("mtime") != mtime]
+        if len(stale) == 1:
+            fresh = {stale[0]: self.scanner.list_c_folders(stale[0])}
+        elif stale:
+            fresh = self.scanner.list_all_c_folders_bulk()
+        else:
+            fresh = {}
+        
+        uids = {}
+        for uid, mtime in mtimes.items():
+            c_folders = fresh.get(uid, []) if uid in stale else cached[uid]["c_folders"]
+            uids[uid] = {"mtime": mtime, "c_folders": c_folders}
+        self._save(uids)
+        return {uid: e["c_folders"] for uid, e in sorted(uids.items()) if e["c_folders"]}
@@ -1,46 +1,88 @@
 #!/usr/bin/env python3
 """B站缓存扫描组件（扫描 UID 和 c_* 文件夹）"""
-import re
-from typing import List
+from typing import Dict, Iterator, List, Tuple
 from registry import registry
+from bili_utils import clean_ls_line, parse_ls
 
 @registry.register("bili.scanner", "service", "list_uids() -> List[str]")
 class BiliScanner:
     def __init__(self):
         self.bili_root = "/storage/emulated/0/Android/data/tv.danmaku.bili/download"
         self.rish_exec = None
+        self.rish_stream = None
     
     def set_rish_executor(self, rish_exec):
         self.rish_exec = rish_exec
     
-    def _parse_ls(self, stdout: str) -> List[str]:
-        """清洗 ls 输出"""
-        result = []
-        for line in stdout.splitlines():
-            name = re.sub(r"\x1b\[[0-9;]*m", "", line).strip()
-            if name:
-                result.append(name)
-        return result
+    def set_rish_stream(self, rish_stream):
+        """注入逐行输出的执行函数（RishExecutor.exec_stream_with_retry）"""
+        self.rish_stream = rish_stream
+    
+    def _lines(self, command: str, timeout: int = 30) -> Iterator[str]:
+        """逐行读取命令输出；未注入流式执行时退回一次性读取"""
+        if self.rish_stream:
+            return self.rish_stream(command, timeout=timeout)
+        if not self.rish_exec:
+            raise RuntimeError("rish_exec 未注入")
+        _, out, _ = self.rish_exec(command, timeout=timeout)
+        return iter(out.splitlines())
     
     def list_uids(self) -> List[str]:
         """返回所有纯数字 UID 文件夹"""
         if not self.rish_exec:
             raise RuntimeError("rish_exec 未注入")
         _, out, _ = self.rish_exec(f"ls '{self.bili_root}'")
-        return [n for n in self._parse_ls(out) if n.isdigit()]
+        return [n for n in parse_ls(out) if n.isdigit()]
+    
+    def iter_c_folders(self, uid: str) -> Iterator[str]:
+        """逐个产出指定 UID 下的 c_* 文件夹（边读边产出）"""
+        path = f"{self.bili_root}/{uid}"
+        for line in self._lines(f"ls '{path}'"):
+            name = clean_ls_line(line)
+            if name.startswith("c_"):
+                yield name
     
     def list_c_folders(self, uid: str) -> List[str]:
         """返回指定 UID 下所有 c_* 文件夹"""
+        return list(self.iter_c_folders(uid))
+    
+    def uid_mtimes(self) -> Dict[str, str]:
+        """返回 {uid: 目录 mtime}（供扫描缓存判断失效，一次 find）"""
         if not self.rish_exec:
             raise RuntimeError("rish_exec 未注入")
-        path = f"{self.bili_root}/{uid}"
-        _, out, _ = self.rish_exec(f"ls '{path}'")
-        return [n for n in self._parse_ls(out) if n.startswith("c_")]
+        _, out, _ = self.rish_exec(
+            f"find '{self.bili_root}' -mindepth 1 -maxdepth 1 -type d -printf '%f %T@\\n'"
+        )
+        result = {}
+        for line in out.splitlines():
+            uid, _, mtime = line.partition(" ")
+            if uid.isdigit():
+                result[uid] = mtime
+        return result
+    
+    def iter_all_c_folders(self) -> Iterator[Tuple[str, str]]:
+        """一次 find 流式产出全部 (uid, c_folder)"""
+        command = f"find '{self.bili_root}' -mindepth 2 -maxdepth 2 -type d -name 'c_*' -printf '%P\\n'"
+        for rel in self._lines(command, timeout=60):
+            uid, _, c_folder = rel.strip().partition("/")
+            if uid.isdigit() and c_folder:
+                yield uid, c_folder
+    
+    def list_all_c_folders_bulk(self) -> Dict[str, List[str]]:
+        """一次 find 取回全部 UID → c_* 映射（替代逐个 UID 的 ls）"""
+        result: Dict[str, List[str]] = {}
+        for uid, c_folder in self.iter_all_c_folders():
+            result.setdefault(uid, []).append(c_folder)
+        for c_folders in result.values():
+            c_folders.sort()
+        return dict(sorted(result.items()))
     
     def list_quality_dirs(self, uid: str, c_folder: str) -> List[str]:
-        """返回质量目录（纯数字目录）"""
+        """返回质量目录（纯数字目录，由 find 在远端完成过滤）"""
         if not self.rish_exec:
             raise RuntimeError("rish_exec 未注入")
         path = f"{self.bili_root}/{uid}/{c_folder}"
-        _, out, _ = self.rish_exec(f"ls '{path}'")
-        return [n for n in self._parse_ls(out) if n.isdigit()]
+        _, out, _ = self.rish_exec(
+            f"find '{path}' -mindepth 1 -maxdepth 1 -type d -regex '.*/[0-9]+$' -printf '%f\\n'"
+        )
+        return out.split()
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """BLV 格式提取器（复制所有 .blv 分段）"""
-import os, json, re
-from typing import List
+import os, json, shutil, tempfile, threading
+from typing import Dict, List, Optional, Tuple
 from registry import registry
+from bili_utils import inherit_context, sort_blv_segments
 
 @registry.register("extractor.blv", "service", "extract(uid, c_folder, quality, temp_dir) -> bool")
 class ExtractorBlv:
@@ -10,35 +11,16 @@ class ExtractorBlv:
         self.bili_root = "/storage/emulated/0/Android/data/tv.danmaku.bili/download"
         self.file_operator = None
         self.rish_exec = None
+        self._streams: Dict[str, List[Tuple[threading.Thread, list]]] = {}
     
     def set_dependencies(self, file_operator, rish_exec):
         self.file_operator = file_operator
         self.rish_exec = rish_exec
     
-    def _parse_ls(self, stdout: str) -> List[str]:
-        result = []
-        for line in stdout.splitlines():
-            name = re.sub(r"\x1b\[[0-9;]*m", "", line).strip()
-            if name:
-                result.append(name)
-        return result
-    
-    def _list_blv_segments(self, uid: str, c_folder: str, quality: str) -> List[str]:
-        """列出所有 .blv 分段"""
-        base = f"{self.bili_root}/{uid}/{c_folder}/{quality}"
-        try:
-            _, out, _ = self.rish_exec(f"ls '{base}'")
-            names = [n for n in self._parse_ls(out) if n.endswith(".blv")]
-            names.sort(key=lambda n: int(n.split(".")[0]) if n.split(".")[0].isdigit() else 0)
-            return [f"{base}/{n}" for n in names]
-        except Exception:
-            return []
-    
-    def _read_index_json(self, uid: str, c_folder: str, quality: str):
+    def _read_index_json(self, base: str):
         """读取 index.json"""
-        path = f"{self.bili_root}/{uid}/{c_folder}/{quality}/index.json"
         try:
-            _, out, _ = self.rish_exec(f"cat '{path}'")
+            _, out, _ = self.rish_exec(f"cat '{base}/index.json'")
             return json.loads(out)
         except Exception:
             return None
@@ -63,28 +45,116 @@ class ExtractorBlv:
             return names
         return []
     
-    def extract(self, uid: str, c_folder: str, quality: str, temp_dir: str) -> bool:
-        """提取 BLV 分段到临时目录"""
+    def _resolve_segments(self, uid: str, c_folder: str, quality: str) -> List[str]:
+        """确定分段路径列表（index.json 顺序优先，否则按 ls 排序）"""
         base = f"{self.bili_root}/{uid}/{c_folder}/{quality}"
-        segments = self._list_blv_segments(uid, c_folder, quality)
+        # 一次目录清单同时提供分段名和 index.json 是否存在，不存在时省掉一次 rish cat
+        try:
+            names = self.file_operator.list_dir(base)
+        except Exception:
+            return []
+        seg_names = sort_blv_segments(names)
         
         # 后备：尝试从 index.json 获取顺序
-        index_data = self._read_index_json(uid, c_folder, quality)
-        if index_data:
-            names_from_index = self._parse_index_json(index_data)
+        if "index.json" in names:
+            names_from_index = self._parse_index_json(self._read_index_json(base))
             if names_from_index:
-                segments = [f"{base}/{n}" for n in names_from_index]
-        
+                seg_names = names_from_index
+        prefix = base + "/"
+        return [prefix + n for n in seg_names]
+    
+    def extract(self, uid: str, c_folder: str, quality: str, temp_dir: str) -> bool:
+        """提取 BLV 分段到临时目录"""
+        segments = self._resolve_segments(uid, c_folder, quality)
         if not segments:
             print(f"❌ BLV：未找到分段文件: {c_folder}")
             return False
         
         print(f"ℹ️  BLV 分段数: {len(segments)}")
-        for seg_path in segments:
-            seg_name = os.path.basename(seg_path)
-            dst = os.path.join(temp_dir, seg_name)
-            if not self.file_operator.copy(seg_path, dst):
-                print(f"❌ 复制分段失败: {seg_name}")
-                return False
+        # 全部分段一次 rish cp 复制到临时目录
+        try:
+            if self.file_operator.copy_many(segments, temp_dir):
+                return True
+        except Exception as e:
+            print(f"❌ 复制分段失败: {e}")
+            return False
+        print(f"❌ 复制分段失败: {c_folder}")
+        return False
+    
+    def local_segments(self, uid: str, c_folder: str, quality: str) -> Optional[List[str]]:
+        """缓存可直接读取时返回分段源路径（供 ffmpeg 直接读取），否则返回 None"""
+        if not self.file_operator or not self.file_operator.local_fs_accessible:
+            return None
+        segments = self._resolve_segments(uid, c_folder, quality)
+        if not segments or not all(self.file_operator.is_locally_readable(s) for s in segments):
+            return None
+        print(f"ℹ️  BLV 分段数: {len(segments)}（直接读取）")
+        return segments
+    
+    def _feed(self, seg_path: str, fifo: str, result: list):
+        """阻塞到 ffmpeg 打开 fifo 后，把分段经 rish cat 灌入；完整写入时把 result[0] 置 True"""
+        try:
+            with open(fifo, "wb") as sink:
+                result[0] = self.file_operator.stream_complete(seg_path, sink)
+        except OSError:
+            pass  # ffmpeg 提前退出，读端已关闭
+        if not result[0]:
+            print(f"⚠️  分段读取异常: {os.path.basename(seg_path)}")
+    
+    def stream(self, uid: str, c_folder: str, quality: str) -> Optional[str]:
+        """
+        为每个分段建立命名管道并启动后台灌流线程，省去落盘复制。
+        
+        Returns:
+            存放 fifo 的目录（交给 merger.merge_blv）；不支持时返回 None，由调用方回退到 extract
+        """
+        if not self.file_operator or not self.file_operator.rish_open or not hasattr(os, "mkfifo"):
+            return None
+        segments = self._resolve_segments(uid, c_folder, quality)
+        if not segments:
+            return None
+        
+        # fifo 放在 Termux 私有临时目录（/storage 的 FUSE 不支持 mkfifo）
+        fifo_dir = tempfile.mkdtemp(prefix=f"bili_{c_folder}_")
+        try:
+            fifos = []
+            for seg_path in segments:
+                fifo = os.path.join(fifo_dir, os.path.basename(seg_path))
+                os.mkfifo(fifo)
+                fifos.append(fifo)
+        except OSError:
+            shutil.rmtree(fifo_dir, ignore_errors=True)
+            return None
+        
+        # 每段一个线程：各自阻塞在 open 上，与 ffmpeg 的打开顺序无关，不会互锁
+        feeds = []
+        for seg_path, fifo in zip(segments, fifos):
+            result = [False]
+            t = threading.Thread(target=inherit_context(self._feed), args=(seg_path, fifo, result), daemon=True)
+            t.start()
+            feeds.append((t, result))
+        self._streams[fifo_dir] = feeds
+        print(f"ℹ️  BLV 分段数: {len(segments)}（流式读取）")
+        return fifo_dir
+    
+    def finish_stream(self, fifo_dir: str) -> bool:
+        """
+        回收灌流线程并删除 fifo 目录（ffmpeg 未读到的 fifo 以非阻塞方式打开一次来唤醒写端）
         
-        return True
+        Returns:
+            所有分段都完整灌入时返回 True；任一段失败、不完整或线程未退出时返回 False
+        """
+        feeds = self._streams.pop(fifo_dir, [])
+        if any(t.is_alive() for t, _ in feeds):
+            for name in os.listdir(fifo_dir):
+                try:
+                    fd = os.open(os.path.join(fifo_dir, name), os.O_RDONLY | os.O_NONBLOCK)
+                    os.close(fd)
+                except OSError:
+                    pass
+        ok = True
+        for t, result in feeds:
+            t.join(timeout=10)
+            ok = ok and not t.is_alive() and result[0]
+        shutil.rmtree(fifo_dir, ignore_errors=True)
+        return ok
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 """DASH 格式提取器（复制 video.m4s + audio.m4s）"""
-import os
-from typing import Optional
+import os, fcntl, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from registry import registry
+from bili_utils import inherit_context
 
 @registry.register("extractor.dash", "service", "extract(uid, c_folder, quality, temp_dir) -> tuple")
 class ExtractorDash:
@@ -10,6 +12,7 @@ class ExtractorDash:
         self.bili_root = "/storage/emulated/0/Android/data/tv.danmaku.bili/download"
         self.file_operator = None
         self.rish_exec = None
+        self._streams: Dict[str, List[Tuple[int, threading.Thread, list]]] = {}
     
     def set_dependencies(self, file_operator, rish_exec):
         self.file_operator = file_operator
@@ -23,45 +26,86 @@ class ExtractorDash:
             (video_dst, audio_dst, success)
         """
         base = f"{self.bili_root}/{uid}/{c_folder}/{quality}"
-        video_dst = f"{temp_dir}/video.m4s"
-        audio_dst = f"{temp_dir}/audio.m4s"
         
-        # 视频文件：优先级根据格式决定
+        # 候选文件优先级根据格式决定；一次 ls 取回目录清单，候选只做集合查找
         v_order = ("video.m4s", "video.mp4") if fmt == "dash" else ("video.mp4", "video.m4s")
-        video_src = None
-        for vname in v_order:
-            candidate = f"{base}/{vname}"
-            if self.file_operator.check_exists(candidate):
-                video_src = candidate
-                break
+        a_order = ("audio.m4s", "audio.mp4") if fmt == "dash" else ("audio.mp4", "audio.m4s")
+        names = self.file_operator.list_dir(base)
         
+        video_src = next((f"{base}/{n}" for n in v_order if n in names), None)
         if not video_src:
             print(f"❌ 视频文件不存在（已尝试 .m4s/.mp4）: {c_folder}")
             return None, None, False
         
-        # 音频文件：同理（允许缺失）
-        a_order = ("audio.m4s", "audio.mp4") if fmt == "dash" else ("audio.mp4", "audio.m4s")
-        audio_src = None
-        for aname in a_order:
-            candidate = f"{base}/{aname}"
-            if self.file_operator.check_exists(candidate):
-                audio_src = candidate
-                break
+        # 音频文件：允许缺失
+        audio_src = next((f"{base}/{n}" for n in a_order if n in names), None)
         
         if not audio_src:
             print("⚠️  未找到音频文件，将仅 remux 视频")
         
-        # 复制文件
+        # 缓存可直接读取时把源路径交给 ffmpeg，跳过复制
+        if self.file_operator.is_locally_readable(video_src) and \
+                (not audio_src or self.file_operator.is_locally_readable(audio_src)):
+            print("ℹ️  缓存可直接读取，跳过复制")
+            return video_src, audio_src, True
+        
+        # 分片 m4s 的 moov 在文件头，可经管道顺序读取：rish cat 直接喂给 ffmpeg，不落盘
+        if fmt == "dash" and self.file_operator.rish_open and video_src.endswith(".m4s") \
+                and (not audio_src or audio_src.endswith(".m4s")):
+            print("ℹ️  经管道流式读取，跳过复制")
+            feeds = [self._open_feed(video_src)]
+            if audio_src:
+                feeds.append(self._open_feed(audio_src))
+            self._streams[temp_dir] = feeds
+            return f"pipe:{feeds[0][0]}", (f"pipe:{feeds[1][0]}" if audio_src else None), True
+        
+        # 复制文件：音视频是两条独立的 rish 流，并发复制（保留源扩展名，merger 据此识别单文件 mp4）
+        video_dst = f"{temp_dir}/{video_src[len(base) + 1:]}"
+        audio_dst = f"{temp_dir}/{audio_src[len(base) + 1:]}" if audio_src else None
         print("🔍 复制文件...")
-        if not self.file_operator.copy(video_src, video_dst):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            copy = inherit_context(self.file_operator.copy)
+            video_future = pool.submit(copy, video_src, video_dst)
+            audio_future = pool.submit(copy, audio_src, audio_dst) if audio_src else None
+            video_ok = video_future.result()
+            audio_ok = audio_future.result() if audio_future else True
+        
+        if not video_ok:
             print(f"❌ 复制视频文件失败: {c_folder}")
             return None, None, False
-        
-        if audio_src:
-            if not self.file_operator.copy(audio_src, audio_dst):
-                print(f"❌ 复制音频文件失败: {c_folder}")
-                return None, None, False
-        else:
-            audio_dst = None
+        if not audio_ok:
+            print(f"❌ 复制音频文件失败: {c_folder}")
+            return None, None, False
         
         return video_dst, audio_dst, True
+    
+    def _open_feed(self, src: str) -> Tuple[int, threading.Thread, list]:
+        """建立管道并启动后台线程把 src 灌入写端，返回 (读端 fd, 线程, 结果槽)"""
+        rfd, wfd = os.pipe()
+        try:
+            fcntl.fcntl(wfd, fcntl.F_SETPIPE_SZ, 1 << 20)
+        except (AttributeError, OSError):
+            pass  # 内核不允许时保持默认 64KiB
+        result = [False]
+        t = threading.Thread(target=inherit_context(self._feed), args=(src, wfd, result), daemon=True)
+        t.start()
+        return rfd, t, result
+    
+    def _feed(self, src: str, wfd: int, result: list):
+        """灌流线程：完整写入且大小与源一致时把 result[0] 置 True"""
+        try:
+            with os.fdopen(wfd, "wb") as sink:
+                result[0] = self.file_operator.stream_complete(src, sink)
+        except OSError:
+            pass  # ffmpeg 提前退出，读端已关闭
+        if not result[0]:
+            print(f"⚠️  流式读取异常: {os.path.basename(src)}")
+    
+    def finish_stream(self, temp_dir: str) -> bool:
+        """合并结束后关闭管道读端并回收灌流线程；任一路读取失败或不完整时返回 False（未使用管道时返回 True）"""
+        ok = True
+        for rfd, t, result in self._streams.pop(temp_dir, []):
+            os.close(rfd)
+            t.join(timeout=10)
+            ok = ok and not t.is_alive() and result[0]
+        return ok
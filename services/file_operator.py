@@ -1,34 +1,121 @@
 #!/usr/bin/env python3
 """文件操作组件（文件存在检查、复制、移动）"""
-import os, math
+import os, math, shutil, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Set
 from registry import registry
+from bili_utils import inherit_context, parse_ls
+
+
+def safe_path(path: str) -> str:
+    """单引号包裹并转义，供拼接 rish shell 命令（B站路径几乎不含单引号，走快路径）"""
+    if "'" not in path:
+        return f"'{path}'"
+    return "'" + path.replace("'", "'\\''") + "'"
+
 
 @registry.register("file.operator", "service", "copy(src: str, dst: str) -> bool")
 class FileOperator:
     def __init__(self):
         self.chunk_threshold = 20 * 1024 * 1024
         self.chunk_size = 10 * 1024 * 1024
+        self.bili_root = "/storage/emulated/0/Android/data/tv.danmaku.bili/download"
+        # Termux 拥有 MANAGE_EXTERNAL_STORAGE 时可直接 stat 缓存目录，免去 rish 往返
+        self.local_fs_accessible = os.access(self.bili_root, os.R_OK | os.X_OK)
         self.rish_exec = None  # 延迟注入
+        self.rish_open = None
+        self.file_index = None
     
     def set_rish_executor(self, rish_exec):
         self.rish_exec = rish_exec
     
+    def set_rish_open(self, rish_open):
+        """注入流式 rish 启动函数（command -> Popen）"""
+        self.rish_open = rish_open
+    
+    def open_remote_read(self, path: str) -> subprocess.Popen:
+        """以 rish cat 打开远程文件，返回 stdout 可读的进程"""
+        if not self.rish_open:
+            raise RuntimeError("rish_open 未注入")
+        return self.rish_open(f"cat {safe_path(path)}")
+    
+    def stream_to(self, path: str, sink) -> int:
+        """把远程文件内容以 1MiB 块写入 sink（文件对象），返回写入字节数；rish cat 失败返回 -1"""
+        proc = self.open_remote_read(path)
+        written = 0
+        try:
+            while True:
+                chunk = proc.stdout.read(1 << 20)
+                if not chunk:
+                    break
+                sink.write(chunk)
+                written += len(chunk)
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+        return written if proc.wait() == 0 else -1
+    
+    def stream_complete(self, path: str, sink) -> bool:
+        """stream_to 并核对源文件大小（无法取得大小时只看 cat 返回码）"""
+        size = self.get_size(path)
+        written = self.stream_to(path, sink)
+        return written >= 0 and (size < 0 or written == size)
+    
     def check_exists(self, path: str) -> bool:
         """检查远程文件是否存在"""
+        if self.local_fs_accessible and path.startswith(self.bili_root):
+            return os.path.isfile(path)
         if not self.rish_exec:
             raise RuntimeError("rish_exec 未注入")
         try:
-            rc, _, _ = self.rish_exec(f"test -f '{path}'", check=False, timeout=15)
+            rc, _, _ = self.rish_exec(f"test -f {safe_path(path)}", check=False, timeout=15, capture=False)
             return rc == 0
         except Exception:
             return False
     
+    def is_locally_readable(self, path: str) -> bool:
+        """Termux 能否直接打开该文件（可读时 ffmpeg 无需经 rish 复制即可读取）"""
+        if not self.local_fs_accessible:
+            return False
+        try:
+            open(path, "rb").close()
+            return True
+        except OSError:
+            return False
+    
+    def set_file_index(self, file_index):
+        """注入缓存文件索引（bili.file_index），list_dir 优先查索引"""
+        self.file_index = file_index
+    
+    def list_dir(self, path: str) -> Set[str]:
+        """列出远程目录下的文件名（先查文件索引，否则单次 rish ls，失败返回空集）"""
+        if self.file_index is not None:
+            names = self.file_index.list_dir(path)
+            if names is not None:
+                return names
+        if self.local_fs_accessible and path.startswith(self.bili_root):
+            try:
+                return set(os.listdir(path))
+            except OSError:
+                return set()
+        if not self.rish_exec:
+            raise RuntimeError("rish_exec 未注入")
+        try:
+            rc, out, _ = self.rish_exec(f"ls -1 {safe_path(path)}", check=False, timeout=15)
+        except Exception:
+            return set()
+        if rc != 0:
+            return set()
+        return set(parse_ls(out))
+    
     def get_size(self, path: str) -> int:
         """获取远程文件大小（字节）"""
         if not self.rish_exec:
             raise RuntimeError("rish_exec 未注入")
         try:
-            _, out, _ = self.rish_exec(f"stat -c %s '{path}'", check=False, timeout=15)
+            _, out, _ = self.rish_exec(f"stat -c %s {safe_path(path)}", check=False, timeout=15)
             return int(out.strip())
         except Exception:
             return -1
@@ -39,34 +126,82 @@ class FileOperator:
         size = self.get_size(src)
         if size > self.chunk_threshold:
             return self._copy_chunked(src, dst, size)
-        return self._copy_direct(src, dst)
+        copied = self._copy_direct(src, dst)
+        if size >= 0 and copied != size:
+            raise IOError(f"复制后大小不一致: {copied} != {size}")
+        return True
     
-    def _copy_direct(self, src: str, dst: str) -> bool:
+    def copy_many(self, srcs: List[str], dst_dir: str) -> bool:
+        """
+        把多个文件复制到同一目录：一次 rish 取回全部源大小，一次 rish 完成 cp 并回报目标大小。
+        任一文件超过分片阈值（或大小无法获取）时退回逐个 copy（4 线程并行）。
+        """
+        if not srcs:
+            return True
         if not self.rish_exec:
             raise RuntimeError("rish_exec 未注入")
-        self.rish_exec(f"cp '{src}' '{dst}'", timeout=480)
-        if not os.path.exists(dst):
+        os.makedirs(dst_dir, exist_ok=True)
+        dsts = [os.path.join(dst_dir, os.path.basename(src)) for src in srcs]
+        quoted = " ".join(safe_path(src) for src in srcs)
+        _, out, _ = self.rish_exec(f"stat -c %s {quoted}", check=False, timeout=30)
+        try:
+            sizes = [int(x) for x in out.split()]
+        except ValueError:
+            sizes = []
+        if len(sizes) != len(srcs) or max(sizes) > self.chunk_threshold:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                return all(pool.map(inherit_context(self.copy), srcs, dsts))
+        
+        quoted_dsts = " ".join(safe_path(dst) for dst in dsts)
+        _, out, _ = self.rish_exec(
+            f"cp {quoted} {safe_path(dst_dir)}/ && stat -c %s {quoted_dsts}",
+            timeout=max(480, 120 * len(srcs))
+        )
+        try:
+            copied = [int(x) for x in out.split()]
+        except ValueError:
             raise FileNotFoundError("复制后文件不存在")
+        if copied != sizes:
+            raise IOError(f"复制后大小不一致: {copied} != {sizes}")
         return True
     
+    def _copy_direct(self, src: str, dst: str) -> int:
+        """单次 rish 调用完成复制并回报目标大小（cp 失败时由 check 抛出）"""
+        if not self.rish_exec:
+            raise RuntimeError("rish_exec 未注入")
+        _, out, _ = self.rish_exec(f"cp {safe_path(src)} {safe_path(dst)} && stat -c %s {safe_path(dst)}", timeout=480)
+        try:
+            return int(out.strip())
+        except ValueError:
+            raise FileNotFoundError("复制后文件不存在")
+    
     def _copy_chunked(self, src: str, dst: str, total_size: int) -> bool:
-        """分片复制"""
+        """分片复制：rish dd 取下一片的同时，后台线程把上一片追加进目标文件"""
         n_chunks = math.ceil(total_size / self.chunk_size)
         parts = []
         print(f"  🔍 分片复制 {os.path.basename(src)} ({total_size//1024//1024}MB, {n_chunks} 片)")
+        
+        def append(out_f, part):
+            with open(part, "rb") as pf:
+                shutil.copyfileobj(pf, out_f, 1 << 20)
+            os.remove(part)
+        
         try:
-            for i in range(n_chunks):
-                part = f"{dst}.part{i}"
-                parts.append(part)
-                cmd = f"dd if='{src}' of='{part}' bs={self.chunk_size} skip={i} count=1 2>/dev/null"
-                self.rish_exec(cmd, timeout=300)
-                if not os.path.exists(part):
-                    raise FileNotFoundError(f"分片 {i} 不存在")
-                print(f"  🔍   片 {i+1}/{n_chunks} ✓", flush=True)
-            with open(dst, "wb") as out_f:
-                for part in parts:
-                    with open(part, "rb") as pf:
-                        out_f.write(pf.read())
+            with open(dst, "wb") as out_f, ThreadPoolExecutor(max_workers=1) as writer:
+                pending = None
+                for i in range(n_chunks):
+                    part = f"{dst}.part{i}"
+                    parts.append(part)
+                    cmd = f"dd if={safe_path(src)} of={safe_path(part)} bs={self.chunk_size} skip={i} count=1 2>/dev/null"
+                    self.rish_exec(cmd, timeout=300)
+                    if not os.path.exists(part):
+                        raise FileNotFoundError(f"分片 {i} 不存在")
+                    if pending:
+                        pending.result()  # 单写线程按序追加；这里只为尽早抛出写入错误
+                    pending = writer.submit(append, out_f, part)
+                    print(f"  🔍   片 {i+1}/{n_chunks} ✓", flush=True)
+                if pending:
+                    pending.result()
             return True
         finally:
             for part in parts:
@@ -1,39 +1,76 @@
 #!/usr/bin/env python3
-"""ffmpeg 合并组件（DASH + BLV）"""
-import os, subprocess
-from typing import Optional
+"""ffmpeg 合并组件（DASH + BLV；全部流复制 -c copy，不重新编码）"""
+import os, shutil, subprocess, threading
+from typing import List, Optional
 from registry import registry
+from bili_utils import sort_blv_segments
+
+
+def _nonempty(path: str) -> bool:
+    """输出文件存在且非空（一次 stat 同时得到两者）"""
+    try:
+        return os.stat(path).st_size > 0
+    except FileNotFoundError:
+        return False
+
 
 @registry.register("merger.ffmpeg", "service", "merge_dash(...) -> bool")
 class MergerFFmpeg:
     def __init__(self):
         self.ffmpeg_path = "/data/data/com.termux/files/usr/bin/ffmpeg"
+        self.ffmpeg_ok = os.path.exists(self.ffmpeg_path)  # 启动时检查一次
+        # 并行处理时限制同时运行的 ffmpeg 数量，避免存储带宽被挤占
+        self.ffmpeg_slots = threading.Semaphore(2)
     
-    def merge_dash(self, temp_dir: str, output_path: str, audio_file: Optional[str] = None) -> bool:
-        """合并 DASH 格式（video.m4s + audio.m4s）"""
-        if not os.path.exists(self.ffmpeg_path):
-            print(f"❌ ffmpeg 未安装: {self.ffmpeg_path}")
-            return False
-        
-        video_file = f"{temp_dir}/video.m4s"
+    def _run_ffmpeg(self, args: list, timeout: int = 600) -> str:
+        """运行 ffmpeg（仅错误级日志、1MiB stderr 管道），返回 stderr；超时抛 TimeoutExpired"""
+        cmd = [self.ffmpeg_path, "-nostats", "-loglevel", "error"] + args
+        # pipe:N 输入要求子进程继承同号 fd
+        pass_fds = tuple(int(a[5:]) for a in args if a.startswith("pipe:") and a[5:].isdigit())
+        with self.ffmpeg_slots:
+            proc = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                bufsize=1 << 20, text=True, pass_fds=pass_fds
+            )
+            try:
+                _, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise
+        return stderr
+    
+    def merge_dash(self, temp_dir: str, output_path: str, audio_file: Optional[str] = None,
+                   video_file: Optional[str] = None) -> bool:
+        """合并 DASH 格式（video.m4s + audio.m4s）；video_file/audio_file 可为缓存源文件或 pipe:N"""
+        if video_file is None:
+            video_file = f"{temp_dir}/video.m4s"
         if audio_file is None:
             audio_file = f"{temp_dir}/audio.m4s" if os.path.exists(f"{temp_dir}/audio.m4s") else None
         
-        if audio_file and os.path.exists(audio_file):
-            cmd = [self.ffmpeg_path, "-i", video_file, "-i", audio_file, "-c", "copy", "-y", output_path]
+        # 单个 mp4 且无音轨：ffmpeg -c copy 只是原样 remux，直接放置文件即可
+        if not audio_file and video_file.endswith(".mp4"):
+            return self._place_mp4(temp_dir, video_file, output_path)
+        
+        if not self.ffmpeg_ok:
+            print(f"❌ ffmpeg 未安装: {self.ffmpeg_path}")
+            return False
+        
+        if audio_file:
+            args = ["-i", video_file, "-i", audio_file, "-c", "copy", "-y", output_path]
             print("ℹ️  合并音视频 (DASH)...")
         else:
-            cmd = [self.ffmpeg_path, "-i", video_file, "-c", "copy", "-y", output_path]
+            args = ["-i", video_file, "-c", "copy", "-y", output_path]
             print("⚠️  仅 remux 视频（无音频流）...")
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            stderr = self._run_ffmpeg(args)
+            if _nonempty(output_path):
                 print(f"✅ 合并成功: {os.path.basename(output_path)}")
                 return True
             print(f"❌ 合并失败: 输出文件不存在或为空")
-            if result.stderr:
-                print(f"🔍 ffmpeg stderr: {result.stderr[:300]}")
+            if stderr:
+                print(f"🔍 ffmpeg stderr: {stderr[:300]}")
             return False
         except subprocess.TimeoutExpired:
             print("❌ ffmpeg 超时 (>10min)")
@@ -42,37 +79,67 @@ class MergerFFmpeg:
             print(f"❌ ffmpeg 异常: {e}")
             return False
     
-    def merge_blv(self, temp_dir: str, output_path: str) -> bool:
-        """合并 BLV 分段（concat demuxer）"""
-        if not os.path.exists(self.ffmpeg_path):
+    def _place_mp4(self, temp_dir: str, video_file: str, output_path: str) -> bool:
+        """零拷贝放置单文件 mp4：临时副本直接改名，缓存源文件尝试硬链接，失败再复制（不移动源文件）"""
+        try:
+            if os.path.dirname(video_file) == temp_dir:
+                try:
+                    os.replace(video_file, output_path)
+                except OSError:
+                    shutil.copyfile(video_file, output_path)
+            else:
+                if os.path.lexists(output_path):
+                    os.remove(output_path)
+                try:
+                    os.link(video_file, output_path)
+                except OSError:
+                    shutil.copyfile(video_file, output_path)
+        except OSError as e:
+            print(f"❌ 放置 mp4 失败: {e}")
+            return False
+        if _nonempty(output_path):
+            print(f"✅ 直接放置成功: {os.path.basename(output_path)}")
+            return True
+        print("❌ 放置失败: 输出文件为空")
+        return False
+    
+    def merge_blv(self, temp_dir: str, output_path: str, segments: Optional[List[str]] = None) -> bool:
+        """合并 BLV 分段（concat demuxer）；segments 为空时扫描 temp_dir 下的 .blv"""
+        if not self.ffmpeg_ok:
             print(f"❌ ffmpeg 未安装: {self.ffmpeg_path}")
             return False
         
-        blv_files = sorted(
-            [f for f in os.listdir(temp_dir) if f.endswith(".blv")],
-            key=lambda n: int(n.split(".")[0]) if n.split(".")[0].isdigit() else 0
-        )
+        if segments is None:
+            # scandir 一次取回名字与完整路径，不再逐个 join
+            with os.scandir(temp_dir) as it:
+                segments = [e.path for e in it if e.name.endswith(".blv")]
+        blv_files = sort_blv_segments(segments)
         if not blv_files:
             print("❌ 临时目录内未找到 .blv 文件")
             return False
         
         concat_list = os.path.join(temp_dir, "concat.txt")
-        with open(concat_list, "w", encoding="utf-8") as f:
-            for name in blv_files:
-                escaped = os.path.join(temp_dir, name).replace("'", "'\\''")
-                f.write(f"file '{escaped}'\n")
+        # 在内存中拼好整个清单，一次写入
+        escaped = [p.replace("'", "'\\''") for p in blv_files]
+        body = "".join(f"file '{p}'\n" for p in escaped)
+        with open(concat_list, "w", encoding="utf-8", buffering=1 << 20) as f:
+            f.write(body)
         
-        cmd = [self.ffmpeg_path, "-f", "concat", "-safe", "0", "-i", concat_list, "-c", "copy", "-y", output_path]
+        # BLV 分段各自从 0 计时，+genpts 在拼接边界重建 PTS；
+        # 分段经 fifo 流式喂入时读取快慢不均，加大输入包队列以减少读线程阻塞
+        args = ["-fflags", "+genpts", "-thread_queue_size", "1024",
+                "-f", "concat", "-safe", "0", "-i", concat_list,
+                "-c", "copy", "-y", output_path]
         print(f"ℹ️  合并 {len(blv_files)} 段 BLV → MP4...")
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            stderr = self._run_ffmpeg(args)
+            if _nonempty(output_path):
                 print(f"✅ BLV 合并成功: {os.path.basename(output_path)}")
                 return True
             print("❌ BLV 合并失败: 输出文件不存在或为空")
-            if result.stderr:
-                print(f"🔍 ffmpeg stderr: {result.stderr[:300]}")
+            if stderr:
+                print(f"🔍 ffmpeg stderr: {stderr[:300]}")
             return False
         except subprocess.TimeoutExpired:
             print("❌ ffmpeg BLV 合并超时 (>10min)")
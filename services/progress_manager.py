@@ -1,36 +1,156 @@
 #!/usr/bin/env python3
-"""进度管理组件（加载/保存进度）"""
-import os, json
+"""进度管理组件（加载/保存进度；基础 JSON + 追加式 .log 日志）"""
+import os, json, time, threading
 from typing import Dict
 from registry import registry
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _dumps_snapshot(progress: dict) -> bytes:
+    """序列化完整进度（缩进 2，便于人工查看）"""
+    if orjson is not None:
+        return orjson.dumps(progress, option=orjson.OPT_INDENT_2)
+    return json.dumps(progress, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _dumps_line(entry: dict) -> bytes:
+    """序列化一条日志记录（紧凑格式，有 orjson 时优先使用）"""
+    if orjson is not None:
+        return orjson.dumps(entry) + b"\n"
+    return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
 @registry.register("progress.manager", "service", "load() -> Dict[str, bool]")
 class ProgressManager:
     def __init__(self):
         self.progress_file = None
+        self._lock = threading.Lock()  # 多线程处理视频时串行化写盘
+        self._dir_ready = False
+        self.flush_every = 10  # 每完成 N 个视频批量落盘一次
+        self._pending = []
+        self._dirty = False  # 有未写入基础 JSON 的完成记录
+        self._progress = None  # 最近一次 load/mark_done 的进度字典，供 force_save 使用
     
     def set_progress_file(self, path: str):
         self.progress_file = path
+        self._dir_ready = False
+    
+    def _ensure_dir(self):
+        """首次写入前创建所在目录，之后不再重复 stat"""
+        if not self._dir_ready:
+            os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
+            self._dir_ready = True
+    
+    @property
+    def log_file(self) -> str:
+        return self.progress_file + ".log"
+    
+    def _fsync_dir(self):
+        """fsync 所在目录，使 rename/删除在掉电后同样生效（部分 FUSE 不支持，忽略）"""
+        try:
+            dfd = os.open(os.path.dirname(self.progress_file), os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        except OSError:
+            return
+        try:
+            os.fsync(dfd)
+        except OSError:
+            pass
+        finally:
+            os.close(dfd)
     
     def load(self) -> Dict[str, bool]:
-        """加载进度记录"""
+        """加载进度记录（基础 JSON，再叠加 .log 中的增量）"""
+        progress = {}
+        if not self.progress_file:
+            return progress
         try:
-            if self.progress_file and os.path.exists(self.progress_file):
-                with open(self.progress_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
+            if os.path.exists(self.progress_file):
+                with open(self.progress_file, "rb") as f:
+                    progress = _loads(f.read())
         except Exception as e:
             print(f"⚠️  读取进度文件失败: {e}")
-        return {}
+        try:
+            if os.path.exists(self.log_file):
+                self._dirty = True  # 上次未正常结束，下次 save 时压缩日志
+                with open(self.log_file, "rb+") as f:
+                    data = f.read()
+                    if data and not data.endswith(b"\n"):
+                        # 崩溃时写了一半的尾行：截掉，否则之后追加的记录会与它拼成同一行而丢失
+                        data = data[:data.rfind(b"\n") + 1]
+                        f.truncate(len(data))
+                for line in data.splitlines():
+                    try:
+                        progress[_loads(line)["c"]] = True
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 损坏的行
+        except Exception as e:
+            print(f"⚠️  读取进度日志失败: {e}")
+        self._progress = progress
+        return progress
+    
+    def mark_done(self, progress: Dict[str, bool], c_folder: str):
+        """记录单个视频完成：缓冲到内存，每 flush_every 条追加写入 .log 一次"""
+        with self._lock:
+            progress[c_folder] = True
+            self._progress = progress
+            self._dirty = True
+            self._pending.append(_dumps_line({"c": c_folder, "t": time.time()}))
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+    
+    def _flush_locked(self):
+        if not self._pending or not self.progress_file:
+            return
+        try:
+            self._ensure_dir()
+            with open(self.log_file, "ab", buffering=0) as f:
+                f.write(b"".join(self._pending))
+                os.fsync(f.fileno())
+            self._pending.clear()
+        except Exception as e:
+            print(f"⚠️  写入进度日志失败: {e}")
+    
+    def force_save(self):
+        """退出/中断时调用：有未保存的完成记录时写出完整快照"""
+        if self._progress is not None:
+            self.save(self._progress)
     
     def save(self, progress: Dict[str, bool]):
-        """保存进度记录"""
+        """保存完整进度并清空 .log（正常退出时压缩日志）；自上次保存后无新完成记录时跳过"""
         try:
             if not self.progress_file:
                 return
-            os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
-            tmp = self.progress_file + ".tmp"
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(progress, f, ensure_ascii=False, indent=2)
-            os.replace(tmp, self.progress_file)
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = dict(progress)
+                self._ensure_dir()
+                data = _dumps_snapshot(snapshot)
+                tmp = self.progress_file + ".tmp"
+                try:
+                    os.remove(tmp)  # 上次崩溃遗留的临时文件
+                except FileNotFoundError:
+                    pass
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                try:
+                    os.write(fd, data)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                os.replace(tmp, self.progress_file)
+                self._pending.clear()  # 已包含在完整快照中
+                self._dirty = False
+                try:
+                    os.remove(self.log_file)
+                except FileNotFoundError:
+                    pass
+                self._fsync_dir()
         except Exception as e:
             print(f"⚠️  保存进度文件失败: {e}")
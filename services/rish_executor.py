@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 """rish 命令执行组件（带重试+素数编码错误记录）"""
-import os, subprocess, time
-from typing import Tuple
+import os, re, subprocess, time, select, atexit, threading, itertools
+from typing import Iterator, Optional, Tuple, Type
 from registry import registry
 from error_log import record_event, exception_to_error
 
+# stderr 特征 → (异常类型, 预格式化消息)；单次正则扫描，命中的分组名即查表键
+_STDERR_ERRORS = {
+    "permission_denied": (PermissionError, "权限被拒绝 — 检查 Shizuku 授权"),
+}
+_STDERR_RE = re.compile(r"(?P<permission_denied>Permission denied)")
+
+
+def _classify(stderr: str) -> Optional[Tuple[Type[Exception], str]]:
+    """对 stderr 做一次扫描，返回应抛出的异常类型与消息（无匹配返回 None）"""
+    if not stderr:
+        return None
+    m = _STDERR_RE.search(stderr)
+    return _STDERR_ERRORS[m.lastgroup] if m else None
+
 @registry.register("rish.executor", "service", "exec(command: str, timeout: int = 30) -> Tuple[int,str,str]")
 class RishExecutor:
     def __init__(self):
@@ -13,48 +27,241 @@ class RishExecutor:
         self.max_retries = 100
         self.retry_delay_base = 2.0
         self.retry_delay_max = 60.0
+        # 常驻 rish 会话：短命令复用同一个 Shizuku 通道，省去每次启动 rish 的握手
+        self.persistent = True
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._session_seq = itertools.count()
+        self._atexit_registered = False
     
-    def exec(self, command: str, check: bool = True, timeout: int = 30) -> Tuple[int, str, str]:
-        """执行单次 rish 命令（不含重试）"""
-        if not os.path.exists(self.rish_path):
-            raise FileNotFoundError(f"rish 未找到: {self.rish_path}")
-        
+    def _env(self) -> dict:
         env = os.environ.copy()
         if self.app_id:
             env["RISH_APPLICATION_ID"] = self.app_id
+        return env
+    
+    def open_stream(self, command: str, bufsize: int = 1 << 20) -> subprocess.Popen:
+        """启动 rish 命令并返回进程，stdout 为字节管道供流式读取（调用方负责 wait）"""
+        if not os.path.exists(self.rish_path):
+            raise FileNotFoundError(f"rish 未找到: {self.rish_path}")
+        proc = subprocess.Popen(
+            [self.rish_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, bufsize=bufsize, env=self._env()
+        )
+        proc.stdin.write(command.encode("utf-8"))
+        proc.stdin.close()
+        return proc
+    
+    def exec_stream(self, command: str, check: bool = True, timeout: int = 30) -> Iterator[str]:
+        """
+        逐行产出命令输出（边传输边解析，不在内存中拼出完整 stdout）。
+        
+        timeout 为连续无输出的最长秒数；stderr 一并收集，结束后与 exec 一样分类报错。
+        调用方提前结束迭代时终止 rish，正常读完则等待其退出并检查返回码。
+        """
+        if not os.path.exists(self.rish_path):
+            raise FileNotFoundError(f"rish 未找到: {self.rish_path}")
+        proc = subprocess.Popen(
+            [self.rish_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, bufsize=0, env=self._env()
+        )
+        proc.stdin.write(command.encode("utf-8"))
+        proc.stdin.close()
+        
+        out_fd, err_fd = proc.stdout.fileno(), proc.stderr.fileno()
+        open_fds = [out_fd, err_fd]
+        pending, err = bytearray(), bytearray()
+        finished = False
+        try:
+            while open_fds:
+                ready, _, _ = select.select(open_fds, [], [], timeout)
+                if not ready:
+                    raise TimeoutError(f"rish 超时 (>{timeout}s 无输出): {command[:80]}")
+                for fd in ready:
+                    chunk = os.read(fd, 1 << 16)
+                    if not chunk:
+                        open_fds.remove(fd)
+                    elif fd == err_fd:
+                        err += chunk
+                    else:
+                        pending += chunk
+                        *lines, rest = pending.split(b"\n")
+                        pending = rest
+                        for raw in lines:
+                            yield raw.decode("utf-8", "replace")
+            if pending:
+                yield pending.decode("utf-8", "replace")
+            finished = True
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+            if not finished:
+                proc.kill()  # 调用方提前结束迭代或超时
+            try:
+                rc = proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()  # 已关闭输出但迟迟不退出
+                rc = proc.wait()
+        
+        error = _classify(err.decode("utf-8", "replace"))
+        if error:
+            exc_type, message = error
+            raise exc_type(message)
+        if check and rc != 0:
+            raise RuntimeError(f"命令失败 (rc={rc}): {command[:80]}")
+    
+    def exec_stream_with_retry(self, command: str, check: bool = True, timeout: int = 30) -> Iterator[str]:
+        """带指数退避重试的 exec_stream；已产出的行无法撤回，因此只在首行之前超时才重试"""
+        attempt = 0
+        while True:
+            started = False
+            try:
+                for line in self.exec_stream(command, check, timeout):
+                    started = True
+                    yield line
+                return
+            except TimeoutError:
+                if started or (self.max_retries >= 0 and attempt >= self.max_retries):
+                    raise
+                delay = self._retry_delay(attempt)
+                print(f"  ⚠ rish 超时，{delay:.1f}s 后重试 ({attempt+1})", flush=True)
+                time.sleep(delay)
+                attempt += 1
+    
+    def _open_session(self) -> subprocess.Popen:
+        """启动常驻 rish 进程（命令经 stdin 逐条送入）"""
+        proc = subprocess.Popen(
+            [self.rish_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, bufsize=0, env=self._env()
+        )
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+        return proc
+    
+    def _drop_session(self):
+        proc, self._session = self._session, None
+        if proc and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    
+    def close(self):
+        """关闭常驻会话（atexit 调用）"""
+        proc, self._session = self._session, None
+        if not proc:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+    
+    def _session_exec(self, command: str, timeout: int) -> Optional[Tuple[int, str, str]]:
+        """
+        在常驻会话中执行一条命令（调用方持有 _session_lock）。
+        
+        命令在子 shell 中运行并以 </dev/null 隔离会话输入；结束后在 stdout 输出 `\n<标记><rc>\n`、
+        在 stderr 输出 `<标记>\n` 作为边界。会话意外退出时返回 None，由调用方改走单次执行。
+        """
+        if self._session is None or self._session.poll() is not None:
+            self._session = self._open_session()
+        proc = self._session
+        marker = f"__BILI_RC_{next(self._session_seq)}__"
+        script = f"( {command}\n) </dev/null\nprintf '\\n%s%d\\n' {marker} $?\necho {marker} >&2\n"
+        try:
+            proc.stdin.write(script.encode("utf-8"))
+        except OSError:
+            self._drop_session()
+            return None
+        
+        out_tail = f"\n{marker}".encode()
+        err_tail = f"{marker}\n".encode()
+        bufs = {proc.stdout.fileno(): bytearray(), proc.stderr.fileno(): bytearray()}
+        out_fd, err_fd = proc.stdout.fileno(), proc.stderr.fileno()
+        deadline = time.monotonic() + timeout
+        while True:
+            out, err = bufs[out_fd], bufs[err_fd]
+            pos = out.find(out_tail)
+            if pos >= 0 and out.endswith(b"\n") and err.endswith(err_tail):
+                rc = int(out[pos + len(out_tail):].strip() or 1)
+                stdout = out[:pos].decode("utf-8", "replace")
+                stderr = err[:-len(err_tail)].decode("utf-8", "replace")
+                return rc, stdout, stderr
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._drop_session()
+                raise TimeoutError(f"rish 超时 (>{timeout}s): {command[:80]}")
+            ready, _, _ = select.select(list(bufs), [], [], remaining)
+            for fd in ready:
+                chunk = os.read(fd, 1 << 16)
+                if not chunk:
+                    self._drop_session()
+                    return None
+                bufs[fd] += chunk
+    
+    def exec(self, command: str, check: bool = True, timeout: int = 30, capture: bool = True) -> Tuple[int, str, str]:
+        """执行单次 rish 命令（不含重试）；capture=False 且 check=False 时丢弃输出，只回报返回码"""
+        if not os.path.exists(self.rish_path):
+            raise FileNotFoundError(f"rish 未找到: {self.rish_path}")
+        
+        # 会话空闲时复用；被其它线程占用（如长时间 cp）时不排队，退回单次执行以保持并行
+        result = None
+        if self.persistent and self._session_lock.acquire(blocking=False):
+            try:
+                result = self._session_exec(command, timeout)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"rish 无法执行: {self.rish_path}")
+            finally:
+                self._session_lock.release()
+        if result is None:
+            result = self._run_once(command, timeout, capture or check)
+        returncode, stdout, stderr = result
+        
+        error = _classify(stderr)
+        if error:
+            exc_type, message = error
+            raise exc_type(message)
+        
+        if check and returncode != 0:
+            raise RuntimeError(f"命令失败 (rc={returncode}): {command[:80]}")
+        
+        return returncode, stdout, stderr
+    
+    def _run_once(self, command: str, timeout: int, capture: bool) -> Tuple[int, str, str]:
+        """单独启动一次 rish 执行命令"""
+        # 不读取输出时直接丢弃，省去管道创建与读取
+        if capture:
+            streams = {"capture_output": True}
+        else:
+            streams = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
         
         try:
             result = subprocess.run(
-                [self.rish_path], input=command,
-                capture_output=True, text=True,
-                timeout=timeout, env=env
+                [self.rish_path], input=command, text=True,
+                timeout=timeout, env=self._env(), **streams
             )
         except subprocess.TimeoutExpired:
             raise TimeoutError(f"rish 超时 (>{timeout}s): {command[:80]}")
         except FileNotFoundError:
             raise FileNotFoundError(f"rish 无法执行: {self.rish_path}")
-        
-        if "Permission denied" in result.stderr:
-            raise PermissionError("权限被拒绝 — 检查 Shizuku 授权")
-        
-        if check and result.returncode != 0:
-            raise RuntimeError(f"命令失败 (rc={result.returncode}): {command[:80]}")
-        
-        return result.returncode, result.stdout, result.stderr
+        return result.returncode, result.stdout or "", result.stderr or ""
+    
+    def _retry_delay(self, attempt: int) -> float:
+        return min(self.retry_delay_base * (2 ** attempt), self.retry_delay_max)
     
-    def exec_with_retry(self, command: str, check: bool = True, timeout: int = 30) -> Tuple[int, str, str]:
+    def exec_with_retry(self, command: str, check: bool = True, timeout: int = 30, capture: bool = True) -> Tuple[int, str, str]:
         """带指数退避重试的执行"""
         attempt = 0
         last_exc = None
         
         while self.max_retries < 0 or attempt <= self.max_retries:
             try:
-                return self.exec(command, check, timeout)
+                return self.exec(command, check, timeout, capture)
             except TimeoutError as e:
                 last_exc = e
                 if self.max_retries >= 0 and attempt >= self.max_retries:
                     break
-                delay = min(self.retry_delay_base * (2 ** attempt), self.retry_delay_max)
+                delay = self._retry_delay(attempt)
                 print(f"  ⚠ rish 超时，{delay:.1f}s 后重试 ({attempt+1})", flush=True)
                 time.sleep(delay)
                 attempt += 1
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+服务组件测试脚本（无需 Shizuku：以 /bin/sh 充当 rish）
+
+测试内容：
+  1. rish 常驻会话：标记解析、超时丢弃会话
+  2. rish 流式输出：正常结束等待退出、提前结束
+  3. 进度日志：.log 回放、残缺尾行、压缩回基础 JSON
+  4. 文件索引：解析 find -printf '%y %P'
+  5. 素数解码：批量/向量化结果与逐事件循环一致
+"""
+import sys, os, json, random, tempfile
+from collections import Counter
+
+# 错误日志导出到临时目录
+import error_log
+test_log_dir = tempfile.mkdtemp(prefix="bili_test_log_")
+error_log.export_dir = test_log_dir
+error_log.enabled = True
+
+print("=" * 70)
+print("服务组件测试")
+print("=" * 70)
+
+import loader
+from registry import registry
+print()
+
+# 1. rish 常驻会话
+print("── 步骤 1: rish 常驻会话 ──")
+rish = registry.get_service("rish.executor")
+rish.rish_path = "/bin/sh"
+rish.app_id = None
+
+rc, out, err = rish.exec("printf 'a\\nb'; echo oops >&2; exit 3", check=False)
+assert (rc, out, err) == (3, "a\nb", "oops\n"), (rc, out, err)
+print(f"  ✅ 标记解析: rc={rc} stdout={out!r} stderr={err!r}")
+
+session = rish._session
+assert session is not None and session.poll() is None
+rc, out, _ = rish.exec("echo __BILI_RC_0__; printf ''")
+assert (rc, out) == (0, "__BILI_RC_0__\n") and rish._session is session, (rc, out)
+print("  ✅ 会话复用，输出中的旧标记不会误判")
+
+try:
+    rish.exec("echo 'Permission denied' >&2", check=False)
+    raise AssertionError("未识别 Permission denied")
+except PermissionError:
+    print("  ✅ stderr 分类: PermissionError")
+
+try:
+    rish.exec("sleep 5", timeout=1)
+    raise AssertionError("未超时")
+except TimeoutError:
+    pass
+assert rish._session is None and session.poll() is not None
+rc, out, _ = rish.exec("echo again")
+assert (rc, out) == (0, "again\n") and rish._session is not session
+print("  ✅ 超时后丢弃会话，下一条命令重建会话")
+rish.close()
+print()
+
+# 2. rish 流式输出
+print("── 步骤 2: rish 流式输出 ──")
+lines = list(rish.exec_stream("printf 'a\\n'; exec 1>&-; sleep 0.2"))
+assert lines == ["a"], lines
+print("  ✅ stdout 先关闭时等待进程退出（不误杀）")
+
+assert list(rish.exec_stream("printf 'x\\ny'")) == ["x", "y"]
+print("  ✅ 无结尾换行的最后一行")
+
+stream = rish.exec_stream("yes")
+assert next(stream) == "y"
+stream.close()
+print("  ✅ 提前结束迭代时终止进程")
+
+try:
+    list(rish.exec_stream("exit 3"))
+    raise AssertionError("未检查返回码")
+except RuntimeError:
+    print("  ✅ 非零返回码抛出 RuntimeError")
+print()
+
+# 3. 进度日志
+print("── 步骤 3: 进度日志 ──")
+progress_dir = tempfile.mkdtemp(prefix="bili_test_progress_")
+progress_mgr = registry.get_service("progress.manager")
+progress_mgr.set_progress_file(os.path.join(progress_dir, "progress.json"))
+with open(progress_mgr.progress_file, "w") as f:
+    json.dump({"c_1": True}, f)
+with open(progress_mgr.log_file, "w") as f:
+    f.write('{"c":"c_2","t":1}\n{"c":"c_3","t":2}\n{"c":"c_4')  # 崩溃时写了一半的尾行
+
+progress = progress_mgr.load()
+assert progress == {"c_1": True, "c_2": True, "c_3": True}, progress
+print(f"  ✅ 回放 .log 并跳过残缺尾行: {sorted(progress)}")
+
+progress_mgr.flush_every = 2
+progress_mgr.mark_done(progress, "c_5")
+progress_mgr.mark_done(progress, "c_6")
+assert progress_mgr.load() == {f"c_{i}": True for i in (1, 2, 3, 5, 6)}
+print("  ✅ 批量追加的记录在残缺尾行之后仍可回放")
+
+progress_mgr.save(progress)
+assert not os.path.exists(progress_mgr.log_file)
+with open(progress_mgr.progress_file) as f:
+    assert json.load(f) == progress
+print("  ✅ save 压缩回基础 JSON 并删除 .log")
+print()
+
+# 4. 文件索引
+print("── 步骤 4: 文件索引 ──")
+file_index = registry.get_service("bili.file_index")
+root = file_index.bili_root
+listing = "\n".join([
+    "d 111", "d 111/c_1", "f 111/c_1/entry.json", "d 111/c_1/80", "d 111/c_1/tmp",
+    "f 111/c_1/80/video.m4s", "f 111/c_1/80/audio.m4s", "d 222", "d 222/c_9",
+    "d 222/c_9/64", "f 222/c_9/64/index.json", "f 222/c_9/64/0.blv", "",
+])
+file_index.set_rish_executor(lambda cmd, **kwargs: (0, listing, ""))
+assert file_index.build() == 12
+assert file_index.list_dir(root) == {"111", "222"}
+assert file_index.list_dir(f"{root}/111/c_1/80/") == {"video.m4s", "audio.m4s"}
+assert file_index.list_dir(f"{root}/111/c_1/tmp") == set()
+assert file_index.list_dir(f"{root}/333") is None
+assert file_index.quality_dirs("111", "c_1") == ["80"]
+assert file_index.quality_dirs("222", "c_9") == ["64"]
+print("  ✅ 目录清单与质量目录查表正确")
+print()
+
+# 5. 素数解码
+print("── 步骤 5: 素数解码 ──")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "visionary_debugtool"))
+import prime_decode
+
+prime_map = {"none": 1, "timeout": 2, "permission": 3, "file_not_found": 5, "runtime": 7}
+primes = prime_decode.sorted_primes(prime_map)
+rng = random.Random(1)
+events = [[t, rng.randrange(4), rng.randrange(4), rng.choice([1, 2, 3, 6, 10, 35, 11, 22, 4, 9, 1001]), 0.0]
+          for t in range(500)]
+
+def reference_decode(composite):
+    """逐个素数整除的原始解码循环"""
+    errors = []
+    for name, p in prime_map.items():
+        if p > 1 and composite % p == 0:
+            errors.append(name)
+            while composite % p == 0:
+                composite //= p
+    if composite > 1:
+        errors.append("unknown_prime")
+    return errors
+
+expected = [reference_decode(e[3]) for e in events]
+expected_count = Counter()
+expected_by_caller = Counter()
+for e, errors in zip(events, expected):
+    expected_count.update(errors or ["none"])
+    expected_by_caller.update((e[1], err) for err in errors)
+
+numpy_available = prime_decode.np is not None
+for backend in (["numpy", "python"] if numpy_available else ["python"]):
+    if backend == "python":
+        prime_decode.np = None
+    assert prime_decode.decode_all(events, primes) == expected
+    assert prime_decode.count_errors(events, primes).most_common() == expected_count.most_common()
+    assert prime_decode.count_errors_by(events, primes, "caller").most_common() == expected_by_caller.most_common()
+    print(f"  ✅ {backend}: decode_all / count_errors / count_errors_by 与逐事件循环一致")
+print()
+
+print("=" * 70)
+print("✅ 所有测试通过！")
+print("=" * 70)
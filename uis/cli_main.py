@@ -1,19 +1,78 @@
 #!/usr/bin/env python3
 """命令行界面（主入口）"""
-import os, sys, time, atexit
+import os, io, sys, time, atexit, argparse, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Tuple
 from registry import registry
 import error_log
 
+_ENV_OK_TTL = 86400  # 环境检查通过后 24 小时内免检
+
+
+def _check_ffmpeg(ffmpeg_path: str) -> bool:
+    """ffmpeg 是否存在"""
+    return os.path.exists(ffmpeg_path)
+
+
+class _TaskOutput:
+    """并行处理时按线程缓冲 stdout：工作线程的输出在任务结束后整段打印，多个视频的日志不再交错"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+    
+    def begin(self):
+        self._local.buf = io.StringIO()
+    
+    def end(self) -> str:
+        buf, self._local.buf = getattr(self._local, "buf", None), None
+        return buf.getvalue() if buf else ""
+    
+    def write(self, text: str) -> int:
+        buf = getattr(self._local, "buf", None)
+        return (buf if buf is not None else self._stream).write(text)
+    
+    def flush(self):
+        if getattr(self._local, "buf", None) is None:
+            self._stream.flush()
+    
+    def propagate(self, fn):
+        """在提交方线程调用：返回的函数在辅助线程中执行时写入提交方任务的缓冲（经 bili_utils.inherit_context）"""
+        buf = getattr(self._local, "buf", None)
+        
+        def run(*args, **kwargs):
+            saved = getattr(self._local, "buf", None)
+            self._local.buf = buf
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.buf = saved
+        return run
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
 @registry.register("ui.cli", "ui", "main() -> int")
 class CliMain:
     def __init__(self):
         self.rish_exec = None
         self.scanner = None
+        self.scan_cache = None
+        self.file_index = None
         self.video_processor = None
         self.progress_mgr = None
         self.exporter = None
         
         self.output_dir = "/storage/emulated/0/Download/B站视频"
+        # 并行处理的视频数（rish 传输与 ffmpeg 都在子进程中，线程即可重叠）
+        self.jobs = min(4, os.cpu_count() or 1)
+        # UID → c_* 映射（一次批量扫描，重入时复用）
+        self._c_folders_by_uid = None
+        self.use_scan_cache = True
+        self._done = set()  # 已完成的 c_* 集合（load 后构建一次，成功后追加）
+        self._env_cached = False  # 本次是否沿用了 .bili_env_ok 的检查结果
+        self._task_output = None  # 并行时的 stdout 缓冲（_TaskOutput）
     
     def setup_dependencies(self):
         """从注册中心获取所有依赖组件实例"""
@@ -21,6 +80,8 @@ class CliMain:
         rish_executor = registry.get_service("rish.executor")
         file_operator = registry.get_service("file.operator")
         self.scanner = registry.get_service("bili.scanner")
+        self.scan_cache = registry.get_service("bili.scan_cache")
+        self.file_index = registry.get_service("bili.file_index")
         entry_reader = registry.get_service("bili.entry_reader")
         format_detector = registry.get_service("bili.format_detector")
         extractor_dash = registry.get_service("extractor.dash")
@@ -33,7 +94,12 @@ class CliMain:
         # 注入 rish_exec 到各个需要它的组件
         self.rish_exec = rish_executor.exec_with_retry
         file_operator.set_rish_executor(self.rish_exec)
+        file_operator.set_rish_open(rish_executor.open_stream)
+        file_operator.set_file_index(self.file_index)
+        self.file_index.set_rish_executor(self.rish_exec)
         self.scanner.set_rish_executor(self.rish_exec)
+        self.scanner.set_rish_stream(rish_executor.exec_stream_with_retry)
+        self.scan_cache.set_scanner(self.scanner)
         entry_reader.set_rish_executor(self.rish_exec)
         format_detector.set_rish_executor(self.rish_exec)
         extractor_dash.set_dependencies(file_operator, self.rish_exec)
@@ -47,11 +113,26 @@ class CliMain:
             extractor_dash=extractor_dash,
             extractor_blv=extractor_blv,
             merger=merger,
-            progress_mgr=self.progress_mgr
+            progress_mgr=self.progress_mgr,
+            file_index=self.file_index
         )
         
-        # 设置进度文件路径
+        # 设置进度文件路径；进度批量落盘，退出（含 Ctrl+C）时写出完整快照
         self.progress_mgr.set_progress_file(f"{self.output_dir}/.bili_progress.json")
+        self.scan_cache.set_cache_file(f"{self.output_dir}/.bili_scan_cache.json")
+        atexit.register(self.progress_mgr.force_save)
+    
+    def parse_args(self, argv=None):
+        """解析命令行参数（-j/--jobs 并行数，--no-cache 强制重新扫描）"""
+        parser = argparse.ArgumentParser(description="B站缓存视频合并工具")
+        parser.add_argument("-j", "--jobs", type=int, default=self.jobs,
+                            help=f"并行处理的视频数（默认 {self.jobs}）")
+        parser.add_argument("--no-cache", action="store_true",
+                            help="忽略扫描缓存，重新扫描 B站缓存目录")
+        args = parser.parse_args(argv)
+        self.jobs = max(1, args.jobs)
+        self.use_scan_cache = not args.no_cache
+        return args
     
     def print_banner(self):
         print("=" * 60)
@@ -60,7 +141,15 @@ class CliMain:
         print()
     
     def check_environment(self) -> bool:
-        """环境检查（rish + ffmpeg）"""
+        """环境检查（rish + ffmpeg）；.bili_env_ok 不足 24 小时时跳过"""
+        try:
+            if time.time() - os.stat(self.env_sentinel).st_mtime < _ENV_OK_TTL:
+                print("✅ 环境: 24 小时内已检查通过")
+                self._env_cached = True
+                return True
+        except OSError:
+            pass
+        
         print("ℹ️  检查环境...")
         
         # 检查 rish（通过调用测试命令）
@@ -77,7 +166,7 @@ class CliMain:
         
         # 检查 ffmpeg
         ffmpeg_path = "/data/data/com.termux/files/usr/bin/ffmpeg"
-        if not os.path.exists(ffmpeg_path):
+        if not _check_ffmpeg(ffmpeg_path):
             print(f"❌ ffmpeg 未安装: {ffmpeg_path}")
             print("ℹ️  运行: pkg install ffmpeg")
             return False
@@ -85,17 +174,41 @@ class CliMain:
         
         return True
     
+    @property
+    def env_sentinel(self) -> str:
+        return f"{self.output_dir}/.bili_env_ok"
+    
     def ensure_output_dir(self):
-        """确保输出目录存在"""
+        """确保输出目录存在（沿用环境检查结果时目录必然已存在），并记录环境检查通过"""
         try:
-            os.makedirs(self.output_dir, exist_ok=True)
+            if not self._env_cached:
+                os.makedirs(self.output_dir, exist_ok=True)
+                with open(self.env_sentinel, "a"):
+                    pass
+                os.utime(self.env_sentinel)
             print(f"✅ 输出目录: {self.output_dir}")
         except Exception as e:
             print(f"❌ 无法创建输出目录: {e}")
             raise
     
+    def _process_task(self, uid: str, c_folder: str, progress: dict) -> Tuple[bool, str]:
+        """线程池任务入口（经注册中心包装，工作线程内同样记录 ui.cli 调用链），返回 (是否成功, 缓冲的日志)"""
+        out = self._task_output
+        if out is None:
+            ok = self.video_processor.process(uid, c_folder, progress)
+            print()  # 视频之间的分隔空行由任务自身输出，不与下一个视频的日志交错
+            return ok, ""
+        out.begin()
+        try:
+            ok = self.video_processor.process(uid, c_folder, progress)
+            print()
+        finally:
+            log = out.end()
+        return ok, log
+    
     def main(self) -> int:
         """主流程"""
+        self.parse_args()
         self.print_banner()
         
         # 1. 设置依赖
@@ -115,17 +228,20 @@ class CliMain:
         
         # 4. 加载进度
         progress = self.progress_mgr.load()
+        self._done = {c for c, ok in progress.items() if ok}
         print(f"ℹ️  已完成 {len(progress)} 个视频")
         print()
         
-        # 5. 扫描 UID
+        # 5. 扫描 UID 与 c_* 文件夹（一次 rish 调用取回全部映射）
         try:
             print("ℹ️  扫描 B站缓存...")
-            uids = self.scanner.list_uids()
-            if not uids:
+            if self._c_folders_by_uid is None:
+                self._c_folders_by_uid = self.scan_cache.list_all_c_folders(refresh=not self.use_scan_cache)
+            c_folders_by_uid = self._c_folders_by_uid
+            if not c_folders_by_uid:
                 print("⚠️  未发现 UID 文件夹")
                 return 1
-            print(f"✅ 发现 {len(uids)} 个 UID 文件夹")
+            print(f"✅ 发现 {len(c_folders_by_uid)} 个 UID 文件夹")
         except Exception as e:
             print(f"❌ 扫描失败: {e}")
             return 1
@@ -134,41 +250,54 @@ class CliMain:
         # 6. 统计
         stats = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
         
-        # 7. 遍历所有 UID
-        for i, uid in enumerate(uids, 1):
-            print(f"ℹ️  处理 UID [{i}/{len(uids)}]: {uid}")
-            
-            # 获取 c_* 列表（带重试）
-            try:
-                c_folders = self.scanner.list_c_folders(uid)
-            except Exception as e:
-                print(f"  ❌ 获取缓存列表失败: {e}")
-                continue
-            
-            if not c_folders:
-                print(f"  ⚠️  未找到缓存文件夹")
-                continue
+        # 7. 遍历所有 UID，汇总待处理任务
+        tasks = []
+        for i, (uid, c_folders) in enumerate(c_folders_by_uid.items(), 1):
+            print(f"ℹ️  UID [{i}/{len(c_folders_by_uid)}]: {uid}")
             
             # 统计待处理数
-            pending = [c for c in c_folders if not progress.get(c)]
+            pending = [c for c in c_folders if c not in self._done]
             done = len(c_folders) - len(pending)
             print(f"  ℹ️  {len(c_folders)} 个缓存：{done} 已完成，{len(pending)} 待处理")
             
             if done:
                 stats['skipped'] += done
             
-            if not pending:
-                continue
-            
-            # 处理每个视频
-            for c_folder in pending:
+            tasks.extend((uid, c_folder) for c_folder in pending)
+        print()
+        
+        # 处理每个视频（并行）
+        if tasks:
+            # 一次 find 建立缓存文件索引，之后质量目录/格式/候选文件都查表，不再逐个视频调用 rish
+            try:
+                count = self.file_index.build()
+                print(f"✅ 缓存文件索引: {count} 项")
+            except Exception as e:
+                print(f"⚠️  建立文件索引失败，改为逐个查询: {e}")
+            print(f"ℹ️  开始处理 {len(tasks)} 个视频（并行 {self.jobs}）")
+            print()
+        # 多线程时各视频的日志先缓冲，完成后整段输出
+        stdout = sys.stdout
+        if self.jobs > 1 and len(tasks) > 1:
+            self._task_output = sys.stdout = _TaskOutput(stdout)
+        pool = ThreadPoolExecutor(max_workers=self.jobs)
+        try:
+            futures = {pool.submit(self._process_task, uid, c_folder, progress): c_folder for uid, c_folder in tasks}
+            for future in as_completed(futures):
+                ok, log = future.result()
+                print(log, end="")
                 stats['total'] += 1
-                success = self.video_processor.process(uid, c_folder, progress)
-                if success:
+                if ok:
                     stats['success'] += 1
+                    self._done.add(futures[future])
                 else:
                     stats['failed'] += 1
-                print()
+        finally:
+            pool.shutdown(cancel_futures=True)
+            sys.stdout, self._task_output = stdout, None
+        
+        # 正常结束：把进度日志压缩回基础 JSON
+        self.progress_mgr.save(progress)
         
         # 8. 最终统计
         print("\n" + "=" * 60)
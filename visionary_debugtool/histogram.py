@@ -11,7 +11,6 @@
     python histogram.py --help                # 显示帮助
 """
 
-import json
 import os
 import sys
 import glob
@@ -20,6 +19,8 @@ import math
 from collections import Counter
 from datetime import datetime
 
+from prime_decode import load_json, sorted_primes, iter_error_names
+
 
 def find_latest_log(log_dir="/storage/emulated/0/Download/B站视频/logs"):
     """在指定目录下找到最新的 error_events_*.json 文件"""
@@ -40,27 +41,6 @@ def find_latest_log(log_dir="/storage/emulated/0/Download/B站视频/logs"):
     return files[0]
 
 
-def decode_errors(composite, prime_map):
-    """从复合值中解码错误类型列表"""
-    if composite <= 1:
-        return ["none"]
-    errors = []
-    remaining = composite
-    # 构建素数到错误名的反向映射
-    rev_map = {v: k for k, v in prime_map.items()}
-    # 注意：素数可能很多，但 prime_map 通常不大
-    for p in sorted(rev_map.keys()):
-        if p <= 1:
-            continue
-        if remaining % p == 0:
-            errors.append(rev_map[p])
-            while remaining % p == 0:
-                remaining //= p
-    if remaining > 1:
-        errors.append("unknown_prime")
-    return errors
-
-
 def print_error_histogram(stats_dict, top_n=15, width=60, log_scale=False):
     """
     打印错误分布的 ASCII 直方图（支持对数归一化）
@@ -139,8 +119,8 @@ def main():
 
     # 读取 JSON
     try:
-        with open(log_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(log_file, "rb") as f:
+            data = load_json(f)
     except Exception as e:
         print(f"❌ 读取日志文件失败: {e}")
         sys.exit(1)
@@ -153,14 +133,10 @@ def main():
         return
 
     # 统计错误类型出现次数
+    primes = sorted_primes(prime_map)
     error_counter = Counter()
-    for event in events:
-        # 事件格式：[t, caller, callee, composite, log_value]
-        composite = event[3]
-        error_list = decode_errors(composite, prime_map)
-        for err in error_list:
-            if err != "none":  # 忽略无错误事件
-                error_counter[err] += 1
+    # 事件格式：[t, caller, callee, composite, log_value]；忽略无错误事件
+    error_counter.update(err for err in iter_error_names(events, primes) if err != "none")
 
     # 打印直方图
     print_error_histogram(error_counter, top_n=args.top, width=args.width, log_scale=args.log)
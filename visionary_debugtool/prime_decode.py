@@ -0,0 +1,153 @@
+"""素数编码错误日志的共享解码工具（show_errors / stats / stats_advanced / histogram 共用）"""
+import json
+from collections import Counter
+
+try:
+    import numpy as np  # 可选：向量化分解
+except ImportError:
+    np = None
+
+try:
+    import orjson  # 可选：C 实现，大日志解析更快
+except ImportError:
+    orjson = None
+
+
+def load_json(f):
+    """从二进制文件对象读取 JSON（有 orjson 时用它解析）"""
+    return orjson.loads(f.read()) if orjson is not None else json.load(f)
+
+
+def sorted_primes(prime_map):
+    """[(素数, 错误名), ...]，按素数升序（小素数命中率最高，先除可最快降低余数），去掉 none=1"""
+    return sorted((p, name) for name, p in prime_map.items() if p > 1)
+
+
+def decode(composite, primes):
+    """分解单个复合值，返回错误名列表；余数降到 1 即停止"""
+    errors = []
+    remaining = composite
+    for p, name in primes:
+        if remaining == 1:
+            break
+        if remaining % p == 0:
+            errors.append(name)
+            remaining //= p
+            while remaining % p == 0:
+                remaining //= p
+    if remaining > 1:
+        errors.append('unknown_prime')
+    return errors
+
+
+def _strip_numpy(comps, primes):
+    """对全部复合值逐个素数做整除，返回 (E×P 命中矩阵, 剩余值)"""
+    remaining = comps.copy()
+    hits = np.zeros((len(comps), len(primes)), dtype=bool)
+    for j, (p, _) in enumerate(primes):
+        mask = (remaining % p == 0) & (remaining > 1)
+        hits[:, j] = mask
+        while mask.any():
+            remaining[mask] //= p
+            mask = (remaining % p == 0) & (remaining > 1)
+    return hits, remaining
+
+
+# 事件固定为 [t, caller, callee, composite, log_value]，按列存放成结构化数组，各字段是连续向量
+EVENT_DTYPE = [('t', 'i8'), ('caller', 'i4'), ('callee', 'i4'), ('composite', 'i8'), ('log', 'f8')]
+_FIELD_INDEX = {name: i for i, (name, _) in enumerate(EVENT_DTYPE)}
+
+
+def event_array(events):
+    """事件列表 → numpy 结构化数组（复合值超出 int64 时抛 OverflowError）"""
+    return np.fromiter((tuple(e) for e in events), dtype=EVENT_DTYPE, count=len(events))
+
+
+def _composites(events):
+    """只需要复合值时直接取这一列，不构造整行"""
+    return np.fromiter((e[3] for e in events), dtype=np.int64, count=len(events))
+
+
+def _ordered_counter(keyed):
+    """keyed 为 [(首次出现位置, 键, 次数), ...]；按首次出现排序后建 Counter，most_common 并列时与逐事件累加的顺序一致"""
+    keyed.sort(key=lambda item: item[0])
+    return Counter({key: cnt for _, key, cnt in keyed})
+
+
+def decode_all(events, primes):
+    """批量解码每个事件；有 numpy 且复合值不超出 int64 时向量化"""
+    if np is not None and events:
+        try:
+            hits, remaining = _strip_numpy(_composites(events), primes)
+        except OverflowError:
+            pass
+        else:
+            names = [name for _, name in primes]
+            decoded = []
+            for row, unk in zip(hits.tolist(), (remaining > 1).tolist()):
+                errors = [n for n, hit in zip(names, row) if hit]
+                if unk:
+                    errors.append('unknown_prime')
+                decoded.append(errors)
+            return decoded
+    return [decode(e[3], primes) for e in events]
+
+
+def count_errors(events, primes):
+    """统计各错误类型出现的事件数（复合值为 1 计入 none）"""
+    if np is not None and events:
+        try:
+            comps = _composites(events)
+        except OverflowError:
+            pass
+        else:
+            hits, remaining = _strip_numpy(comps, primes)
+            # 每列：(掩码, 键, 同一事件内的先后)；none 事件不会再命中其它列
+            columns = [(comps == 1, 'none', 0)]
+            columns += [(hits[:, j], name, j) for j, (_, name) in enumerate(primes)]
+            columns.append((remaining > 1, 'unknown_prime', len(primes)))
+            keyed = [((int(mask.argmax()), order), name, int(mask.sum()))
+                     for mask, name, order in columns if mask.any()]
+            return _ordered_counter(keyed)
+    counter = Counter()
+    counter.update(iter_error_names(events, primes))
+    return counter
+
+
+def count_errors_by(events, primes, field):
+    """按事件字段（'caller' / 'callee'）分组统计错误：{(字段值, 错误名): 事件数}；有 numpy 时按列向量计算"""
+    if np is not None and events:
+        try:
+            arr = event_array(events)
+        except OverflowError:
+            pass
+        else:
+            hits, remaining = _strip_numpy(arr['composite'], primes)
+            group = arr[field]
+            columns = [(hits[:, j], name) for j, (_, name) in enumerate(primes)]
+            columns.append((remaining > 1, 'unknown_prime'))
+            keyed = []
+            for order, (mask, name) in enumerate(columns):
+                idx = np.flatnonzero(mask)
+                if not len(idx):
+                    continue
+                values, first, counts = np.unique(group[idx], return_index=True, return_counts=True)
+                keyed.extend(((int(idx[f]), order), (v, name), c)
+                             for v, f, c in zip(values.tolist(), first.tolist(), counts.tolist()))
+            return _ordered_counter(keyed)
+    i = _FIELD_INDEX[field]
+    counter = Counter()
+    for e in events:
+        for err in decode(e[3], primes):
+            counter[(e[i], err)] += 1
+    return counter
+
+
+def iter_error_names(events, primes):
+    """逐个产出每个事件解码出的错误名（复合值为 1 产出 none），供 Counter.update 一次性计数"""
+    for e in events:
+        composite = e[3]
+        if composite == 1:
+            yield 'none'
+        else:
+            yield from decode(composite, primes)
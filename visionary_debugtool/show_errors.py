@@ -1,28 +1,25 @@
-import json
+import sys
+
+from prime_decode import load_json, sorted_primes, decode_all
 
 log_file = "/storage/emulated/0/Download/B站视频/logs/error_events_20260219_123247.json"
 adj_file = "/storage/emulated/0/Download/B站视频/logs/adjacency_matrix_20260219_123247.json"
 
-with open(adj_file) as f:
-    nodes = json.load(f)['nodes']
+with open(adj_file, 'rb') as f:
+    nodes = load_json(f)['nodes']
 
-with open(log_file) as f:
-    data = json.load(f)
+with open(log_file, 'rb') as f:
+    data = load_json(f)
     prime_map = data['prime_map']
-    rev_map = {v: k for k, v in prime_map.items()}
+    primes = sorted_primes(prime_map)
     events = data['events']
 
-print("错误事件详情（t, 调用者, 被调用者, 复合值, 解码错误）")
-for t, caller, callee, composite, log_val in events:
-    if composite == 1:
-        continue
-    remaining = composite
-    errors = []
-    for p, name in rev_map.items():
-        if p > 1 and remaining % p == 0:
-            errors.append(name)
-            while remaining % p == 0:
-                remaining //= p
-    if remaining > 1:
-        errors.append('unknown_prime')
-    print(f"t={t:4d} {nodes[caller]:30s} → {nodes[callee]:30s} comp={composite:3d} log={log_val:7.4f} errors={errors}")
+events = [e for e in events if e[3] != 1]
+decoded = decode_all(events, primes)
+
+# 先拼好全部行再一次写出，避免逐行 print 的加锁与刷新
+row_fmt = "t={:4d} {:30s} → {:30s} comp={:3d} log={:7.4f} errors={}".format
+rows = ["错误事件详情（t, 调用者, 被调用者, 复合值, 解码错误）"]
+rows.extend(row_fmt(t, nodes[caller], nodes[callee], composite, log_val, errors)
+            for (t, caller, callee, composite, log_val), errors in zip(events, decoded))
+sys.stdout.write("\n".join(rows) + "\n")
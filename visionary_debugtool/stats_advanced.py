@@ -1,38 +1,22 @@
-import json
 from collections import Counter
 
+from prime_decode import load_json, sorted_primes, count_errors_by
+
 log_file = "/storage/emulated/0/Download/B站视频/logs/error_events_20260219_123247.json"
 adj_file = "/storage/emulated/0/Download/B站视频/logs/adjacency_matrix_20260219_123247.json"
 
-with open(log_file) as f:
-    data = json.load(f)
+with open(log_file, 'rb') as f:
+    data = load_json(f)
 prime_map = data['prime_map']
-rev_map = {v: k for k, v in prime_map.items()}
+primes = sorted_primes(prime_map)
 events = data['events']
 
-with open(adj_file) as f:
-    adj_data = json.load(f)
+with open(adj_file, 'rb') as f:
+    adj_data = load_json(f)
 nodes = adj_data['nodes']  # 组件名列表，索引从0开始
 
-caller_errors = Counter()
-callee_errors = Counter()
-
-for t, caller, callee, composite, log_val in events:
-    if composite == 1:
-        continue
-    # 解码错误类型
-    remaining = composite
-    errors = []
-    for p, name in rev_map.items():
-        if p > 1 and remaining % p == 0:
-            errors.append(name)
-            while remaining % p == 0:
-                remaining //= p
-    if remaining > 1:
-        errors.append('unknown_prime')
-    for err in errors:
-        caller_errors[(nodes[caller], err)] += 1
-        callee_errors[(nodes[callee], err)] += 1
+caller_errors = Counter({(nodes[c], err): n for (c, err), n in count_errors_by(events, primes, 'caller').items()})
+callee_errors = Counter({(nodes[c], err): n for (c, err), n in count_errors_by(events, primes, 'callee').items()})
 
 print("按调用者统计错误：")
 for (comp, err), cnt in caller_errors.most_common():